@@ -1,44 +1,50 @@
-from flask import Flask, render_template, request, jsonify
-from src import WhitespaceTokenizer, RegexTokenizer, BPETokenizer, CustomHFTokenizer, CustomSPTokenizer
+from flask import Flask, Response, render_template, request, jsonify, g
+from src.registry import TokenizerRegistry
+from src.jobs import TrainingJobs
+from src.result_cache import ResultCache, text_key
+from src.metrics import METRICS, SlowRequestProfiler
 from collections import Counter
 import os
 from werkzeug.utils import secure_filename
-import tempfile
 import re
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
-# Initialize tokenizers
-tokenizers = {
-    'whitespace': WhitespaceTokenizer(),
-    'regex': RegexTokenizer(pattern='gpt2'),
-    'bpe': BPETokenizer(),
-    'hf': CustomHFTokenizer(),
-    'sp': CustomSPTokenizer()
-}
-
-# Load pre-trained vocabularies if they exist
-for name, tokenizer in tokenizers.items():
-    if name == 'hf':
-        vocab_file = 'trained_vocabs/hf_vocab.json'
-        if os.path.exists(vocab_file):
-            tokenizer.load(vocab_file)
-            logging.info(f"Loaded pre-trained vocabulary for {name} tokenizer")
-        else:
-            logging.warning(f"Vocabulary file {vocab_file} not found for {name} tokenizer")
-    elif name == 'sp':
-        vocab_file = 'trained_vocabs/sp_vocab.model'
-    elif name == 'regex':
-        vocab_file = 'trained_vocabs/regex_vocab_gpt2.txt'
-    elif name == 'bpe':
-        vocab_file = 'trained_vocabs/bpe_vocab.txt'
-    else:
-        vocab_file = f'trained_vocabs/{name}_vocab.txt'
-    
-    if os.path.exists(vocab_file):
-        tokenizer.load(vocab_file)
-        print(f"Loaded pre-trained vocabulary for {name} tokenizer")
+# Tokenizers are imported and loaded on first use; TOKENIZER_WARMUP lists the
+# ones to load at startup, e.g. TOKENIZER_WARMUP=regex,bpe
+tokenizers = TokenizerRegistry(warmup=os.environ.get('TOKENIZER_WARMUP', '').split(','))
+
+# Backends whose batch encoders run native code without holding the GIL
+NATIVE_BACKENDS = ('hf', 'sp')
+batch_executor = ThreadPoolExecutor(max_workers=len(NATIVE_BACKENDS))
+
+# Training runs in a separate process and swaps the finished model into the registry
+training_jobs = TrainingJobs(tokenizers)
+
+# Finished /tokenize results per tokenizer, keyed by model version and text hash;
+# a tokenizer's entries are dropped when training replaces its model
+result_cache = ResultCache(max_bytes=int(os.environ.get('RESULT_CACHE_BYTES', 64 << 20)),
+                           max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 10000)))
+tokenizers.swap_listeners.append(result_cache.invalidate)
+
+# PROFILE_SLOW_MS=<ms> keeps cProfile dumps of sampled requests slower than that
+profiler = SlowRequestProfiler.from_env()
+
+@app.before_request
+def start_profiling():
+    g.profiler = profiler.start()
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def stop_profiling(response):
+    if getattr(g, 'profiler', None) is not None:
+        path = profiler.stop(g.profiler, time.perf_counter() - g.request_start, request.endpoint or 'unknown')
+        if path:
+            logging.info(f"Saved profile of slow {request.path} request to {path}")
+    return response
 
 import re
 
@@ -75,7 +81,7 @@ def add_space_except_first(string_list):
 
 @app.route('/')
 def index():
-    return render_template('index.html', tokenizers=tokenizers.keys())
+    return render_template('index.html', tokenizers=tokenizers.names())
 
 @app.route('/tokenize', methods=['POST'])
 def tokenize():
@@ -89,16 +95,17 @@ def tokenize():
     results = {}
 
     for name in tokenizer_names:
-        tokenizer = tokenizers[name]
         try:
-            tokens = tokenizer.tokenize(text)
-            logging.debug(f"{name} tokenizer - tokens: {tokens}")
-            
-            encoded = tokenizer.encode(text)
-            logging.debug(f"{name} tokenizer - encoded: {encoded}")
-            
+            tokenizer, version = tokenizers.get_with_version(name)
+            key = text_key(name, version, text)
+            cached = result_cache.get(key)
+            if cached is not None:
+                results[name] = cached
+                continue
+
+            # One pass gives tokens, IDs and offsets instead of tokenizing twice
+            tokens, encoded, offsets = tokenizer.encode_full(text)
             decoded = tokenizer.decode(encoded)
-            logging.debug(f"{name} tokenizer - decoded: {decoded}")
 
             if isinstance(decoded, str):
                 decoded_tokens = decoded.split()
@@ -106,14 +113,96 @@ def tokenize():
                 decoded_tokens = decoded
             
             decoded_tokens = add_space_except_first(decoded_tokens)
-            logging.debug(f"{name} tokenizer - decoded_tokens: {decoded_tokens}")
+            # Lazy formatting: the token lists are only stringified when DEBUG is on
+            logging.debug("%s tokenizer - %d tokens: %s", name, len(tokens), tokens)
 
             results[name] = {
                 'tokens': tokens,
                 'encoded': encoded,
+                'offsets': offsets,
                 'decoded': decoded_tokens,
                 'frequencies': dict(Counter(tokens))
             }
+            result_cache.put(key, results[name])
+        except Exception as e:
+            logging.error(f"Error with {name} tokenizer: {str(e)}")
+            results[name] = {'error': str(e)}
+
+    return jsonify(results)
+
+def encode_texts(name, texts):
+    """Batch-encode texts with one tokenizer, isolating failures to the items that cause them.
+
+    Returns flat IDs plus offsets (as from encode_batch) and a map of item
+    index to error message; failed items get an empty ID range.
+    """
+    tokenizer = tokenizers.get(name)
+    errors = {i: 'Text must be a string' for i, text in enumerate(texts) if not isinstance(text, str)}
+    valid = ['' if i in errors else text for i, text in enumerate(texts)]
+    # Pure-Python tokenizers encode inline: a process pool per request costs more than it saves
+    num_workers = None if name in NATIVE_BACKENDS else 1
+    try:
+        ids, offsets = tokenizer.encode_batch(valid, num_workers=num_workers)
+        ids, offsets = ids.tolist(), offsets.tolist()
+    except Exception:
+        # Fall back to one text at a time so a single bad item cannot fail the batch
+        ids, offsets = [], [0]
+        for i, text in enumerate(valid):
+            if i not in errors:
+                try:
+                    ids.extend(tokenizer.encode(text))
+                except Exception as e:
+                    errors[i] = str(e)
+            offsets.append(len(ids))
+    return {'ids': ids, 'offsets': offsets, 'errors': errors}
+
+@app.route('/tokenize_batch', methods=['POST'])
+def tokenize_batch():
+    data = request.get_json()
+    texts = data.get('texts')
+    tokenizer_names = data.get('tokenizers', [])
+
+    if not isinstance(texts, list) or not texts:
+        return jsonify({'error': 'No texts provided'}), 400
+
+    results = {}
+    # The HF and SentencePiece backends release the GIL, so they run on the
+    # thread pool while the pure-Python tokenizers run in this thread
+    futures = {name: batch_executor.submit(encode_texts, name, texts)
+               for name in tokenizer_names if name in NATIVE_BACKENDS}
+    for name in tokenizer_names:
+        if name in futures:
+            continue
+        try:
+            results[name] = encode_texts(name, texts)
+        except Exception as e:
+            logging.error(f"Error with {name} tokenizer: {str(e)}")
+            results[name] = {'error': str(e)}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logging.error(f"Error with {name} tokenizer: {str(e)}")
+            results[name] = {'error': str(e)}
+
+    return jsonify(results)
+
+@app.route('/count', methods=['POST'])
+def count():
+    # Budget checks only need the count, so no tokens, IDs or decoded text are built
+    data = request.get_json()
+    text = data.get('text')
+    texts = data.get('texts')
+    tokenizer_names = data.get('tokenizers', [])
+
+    if not text and not (isinstance(texts, list) and texts):
+        return jsonify({'error': 'No text provided'}), 400
+
+    results = {}
+    for name in tokenizer_names:
+        try:
+            tokenizer = tokenizers.get(name)
+            results[name] = tokenizer.count_tokens(text) if text else tokenizer.count_tokens_batch(texts)
         except Exception as e:
             logging.error(f"Error with {name} tokenizer: {str(e)}")
             results[name] = {'error': str(e)}
@@ -128,38 +217,46 @@ def train():
     if not files or files[0].filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    tokenizer_name = request.form['tokenizer']
-    tokenizer = tokenizers[tokenizer_name]
+    tokenizer_name = request.form.get('tokenizer')
+    if tokenizer_name not in tokenizers:
+        return jsonify({'error': f'Unknown tokenizer: {tokenizer_name}'}), 400
 
-    # Create a temporary directory to store uploaded files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for file in files:
-            if file and file.filename.endswith('.txt'):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(temp_dir, filename)
-                file.save(filepath)
+    # The uploaded files stay in the job directory until the job finishes
+    job_dir = training_jobs.create_job_dir()
+    corpus_dir = os.path.join(job_dir, 'corpus')
+    os.makedirs(corpus_dir)
+    for file in files:
+        if file and file.filename.endswith('.txt'):
+            filename = secure_filename(file.filename)
+            filepath = os.path.join(corpus_dir, filename)
+            file.save(filepath)
 
-        # Train the tokenizer
-        if isinstance(tokenizer, (BPETokenizer, CustomHFTokenizer, CustomSPTokenizer)):
-            tokenizer.train(temp_dir)
-        else:
-            corpus = ""
-            for filename in os.listdir(temp_dir):
-                with open(os.path.join(temp_dir, filename), 'r', encoding='utf-8') as f:
-                    corpus += f.read() + "\n"
-            tokenizer.fit(corpus)
-
-    # Save the new vocabulary
-    if tokenizer_name == 'hf':
-        vocab_file = 'trained_vocabs/hf_vocab.json'
-    elif tokenizer_name == 'sp':
-        vocab_file = 'trained_vocabs/sp_vocab.model'
-    else:
-        vocab_file = f'trained_vocabs/{tokenizer_name}_vocab.txt'
-    
-    tokenizer.save(vocab_file)
+    job_id = training_jobs.submit(tokenizer_name, corpus_dir, job_dir=job_dir)
+    return jsonify({'message': f'{tokenizer_name} tokenizer training queued on {len(files)} files',
+                    'job_id': job_id}), 202
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    caches = [(name, 'result', info) for name, info in sorted(result_cache.name_info().items())]
+    for name in tokenizers.names():
+        if tokenizers.is_loaded(name) and hasattr(tokenizers.get(name), 'cache_info'):
+            caches.append((name, 'bpe_words', tokenizers.get(name).cache_info()))
+    return Response(METRICS.render(caches), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.info())
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify(training_jobs.list())
 
-    return jsonify({'message': f'{tokenizer_name} tokenizer trained successfully on {len(files)} files'})
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = training_jobs.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,221 @@
+"""Benchmark every tokenizer on the bundled corpus.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --output benchmarks/results.json
+    python -m benchmarks.run_benchmarks --update_baseline   # store the current numbers as the baseline
+
+Each result is compared with ``benchmarks/baseline.json`` when it exists. The
+exit status is 1 when a metric regressed by more than ``--tolerance``.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from src.registry import DEFAULT_SPECS
+from src.utils import iter_corpus, peak_rss_mb
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Metric name -> True when higher is better
+METRIC_DIRECTIONS = {
+    "train_seconds": False,
+    "train_peak_rss_mb": False,
+    "cold_load_seconds": False,
+    "encode_mb_per_s": True,
+    "encode_tokens_per_s": True,
+    "decode_mb_per_s": True,
+    "decode_tokens_per_s": True,
+}
+
+
+def _make_tokenizer(name: str):
+    spec = DEFAULT_SPECS[name]
+    tokenizer_class = getattr(importlib.import_module(spec.module), spec.class_name)
+    return tokenizer_class(**spec.kwargs)
+
+
+def _train_task(name: str, corpus_dir: str) -> dict:
+    # Runs in a fresh process so the peak RSS belongs to this training run only
+    tokenizer = _make_tokenizer(name)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    if hasattr(tokenizer, "fit"):
+        tokenizer.fit(iter_corpus(corpus_dir))
+    else:
+        tokenizer.train(corpus_dir)
+    return {"train_seconds": time.perf_counter() - start,
+            "train_peak_rss_mb": peak_rss_mb(),
+            "train_rss_before_mb": rss_before}
+
+
+def _load_task(name: str, vocab_file: str) -> float:
+    # A fresh interpreter, so the import of the backend is part of the cold load
+    start = time.perf_counter()
+    tokenizer = _make_tokenizer(name)
+    tokenizer.load(vocab_file)
+    return time.perf_counter() - start
+
+
+def run_in_fresh_process(fn, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def _best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_throughput(tokenizer, lines, batch_sizes, repeat: int) -> dict:
+    """Encode and decode ``lines`` one at a time and in batches; returns MB/s and tokens/s per batch size."""
+    total_bytes = sum(len(line.encode("utf-8")) for line in lines)
+    encoded = [tokenizer.encode(line) for line in lines]
+    total_tokens = sum(len(ids) for ids in encoded)
+    results = {"bytes": total_bytes, "tokens": total_tokens,
+               "tokens_per_byte": total_tokens / total_bytes if total_bytes else 0.0}
+
+    for batch_size in batch_sizes:
+        if batch_size == 1:
+            run = lambda: [tokenizer.encode(line) for line in lines]
+        else:
+            batches = [lines[i:i + batch_size] for i in range(0, len(lines), batch_size)]
+            run = lambda: [tokenizer.encode_batch(batch, num_workers=1) for batch in batches]
+        seconds = _best_time(run, repeat)
+        results[f"batch_{batch_size}"] = {
+            "encode_seconds": seconds,
+            "encode_mb_per_s": total_bytes / seconds / 1e6,
+            "encode_tokens_per_s": total_tokens / seconds,
+        }
+
+    seconds = _best_time(lambda: [tokenizer.decode(ids) for ids in encoded], repeat)
+    results["decode_seconds"] = seconds
+    results["decode_mb_per_s"] = total_bytes / seconds / 1e6
+    results["decode_tokens_per_s"] = total_tokens / seconds
+    return results
+
+
+def run_benchmarks(names, corpus_dir: str, batch_sizes, repeat: int, max_lines: int, train: bool) -> dict:
+    lines = [line for line in iter_corpus(corpus_dir) if line.strip()][:max_lines]
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                 "corpus_dir": corpus_dir, "lines": len(lines), "batch_sizes": list(batch_sizes),
+                 "repeat": repeat},
+        "results": {},
+    }
+    for name in names:
+        print(f"Benchmarking {name} tokenizer...")
+        spec = DEFAULT_SPECS[name]
+        result = {}
+        if train:
+            result.update(run_in_fresh_process(_train_task, name, os.path.abspath(corpus_dir)))
+        result["cold_load_seconds"] = run_in_fresh_process(_load_task, name, spec.vocab_file)
+        tokenizer = _make_tokenizer(name)
+        tokenizer.load(spec.vocab_file)
+        result.update(bench_throughput(tokenizer, lines, batch_sizes, repeat))
+        report["results"][name] = result
+    return report
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    """Flatten nested per-batch results into 'batch_32.encode_mb_per_s' style keys."""
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics that are worse than the baseline by more than ``tolerance`` (a fraction), plus any
+    change in tokens per byte, which should only move when a tokenizer's output changes."""
+    regressions = []
+    same_input = baseline.get("meta", {}).get("lines") == report["meta"]["lines"]
+    for name, result in report["results"].items():
+        base = flatten(baseline.get("results", {}).get(name, {}))
+        for key, value in flatten(result).items():
+            if key not in base or not base[key]:
+                continue
+            old = base[key]
+            metric = key.rsplit(".", 1)[-1]
+            if metric == "tokens_per_byte":
+                if same_input and abs(value - old) / old > 1e-6:
+                    regressions.append(f"{name} {key}: {old:.4f} -> {value:.4f} (output changed)")
+                continue
+            if metric not in METRIC_DIRECTIONS:
+                continue
+            change = (value - old) / old
+            worse = -change if METRIC_DIRECTIONS[metric] else change
+            if worse > tolerance:
+                regressions.append(f"{name} {key}: {old:.4g} -> {value:.4g} ({change:+.1%})")
+    return regressions
+
+
+def print_summary(report: dict) -> None:
+    batch_sizes = report["meta"]["batch_sizes"]
+    header = ["tokenizer", "train s", "peak MB", "load s", "tok/byte"] + \
+             [f"enc MB/s @{b}" for b in batch_sizes] + ["dec MB/s"]
+    print(" | ".join(header))
+    for name, r in report["results"].items():
+        row = [name, f"{r.get('train_seconds', float('nan')):.2f}", f"{r.get('train_peak_rss_mb', float('nan')):.0f}",
+               f"{r['cold_load_seconds']:.3f}", f"{r['tokens_per_byte']:.3f}"]
+        row += [f"{r[f'batch_{b}']['encode_mb_per_s']:.2f}" for b in batch_sizes]
+        row.append(f"{r['decode_mb_per_s']:.2f}")
+        print(" | ".join(row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tokenizers on the bundled corpus")
+    parser.add_argument("--tokenizers", default=",".join(DEFAULT_SPECS), help="Comma-separated tokenizer names")
+    parser.add_argument("--corpus_dir", default="data/corpus", help="Directory with the .txt corpus")
+    parser.add_argument("--batch_sizes", default="1,32,256", help="Comma-separated encode batch sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is kept")
+    parser.add_argument("--max_lines", type=int, default=5000, help="Corpus lines used for throughput")
+    parser.add_argument("--skip_train", action="store_true", help="Skip the training benchmark")
+    parser.add_argument("--output", default="benchmarks/results.json", help="Where to write the JSON report")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--update_baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown before flagging, as a fraction")
+    args = parser.parse_args()
+
+    names = [name for name in args.tokenizers.split(",") if name]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    report = run_benchmarks(names, args.corpus_dir, batch_sizes, args.repeat, args.max_lines, not args.skip_train)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    print_summary(report)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; rerun with --update_baseline to store one")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        regressions = compare(report, json.load(f), args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) against {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,7 @@ def demonstrate_tokenizer(tokenizer, text):
 
 def main():
     corpus_dir = "data/corpus/"
-    vocab_file = "trained_vocabs/bpe_vocab.txt"
+    vocab_file = "trained_vocabs/bpe_vocab.bin"
 
     # Train and save
     tokenizer = BPETokenizer()
@@ -30,7 +30,7 @@ def main():
         print("Vocabulary size:", len(tokenizer.vocab))
 
         # Save the vocabulary
-        vocab_file = f"trained_vocabs/regex_vocab_{pattern}.txt"
+        vocab_file = f"trained_vocabs/regex_vocab_{pattern}.bin"
         tokenizer.save(vocab_file)
 
         # Load the vocabulary
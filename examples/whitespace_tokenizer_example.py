@@ -16,7 +16,7 @@ def demonstrate_tokenizer(tokenizer, text):
 
 def main():
     corpus_dir = "data/corpus/"
-    vocab_file = "trained_vocabs/whitespace_vocab.txt"
+    vocab_file = "trained_vocabs/whitespace_vocab.bin"
     
     text = read_corpus(corpus_dir)
 
@@ -1,8 +1,13 @@
 from src import (
     WhitespaceTokenizer, RegexTokenizer, BPETokenizer,
     CustomHFTokenizer, CustomSPTokenizer,
-    read_corpus, get_vocab, save_vocab, load_vocab
+    read_corpus, iter_corpus, get_vocab, save_vocab, load_vocab
 )
+from src.bpe_tokenizer import convert_vocab_file
+from src.custom_hf_tokenizer import configure_parallelism
+from src.shards import write_shards
+from src.train_all import train_all
+from functools import partial
 import os
 import argparse
 import shutil
@@ -10,7 +15,7 @@ import shutil
 def get_vocab_file_with_extension(tokenizer_type, vocab_file):
     base_name = os.path.splitext(vocab_file)[0]
     if tokenizer_type in ["whitespace", "regex", "bpe"]:
-        return f"{base_name}.txt"
+        return f"{base_name}.bin"
     elif tokenizer_type == "sp":
         return f"{base_name}.model"
     elif tokenizer_type == "hf":
@@ -18,26 +23,24 @@ def get_vocab_file_with_extension(tokenizer_type, vocab_file):
     else:
         raise ValueError(f"Unknown tokenizer type: {tokenizer_type}")
 
-def train_and_save_tokenizer(tokenizer, corpus_dir, vocab_file):
-    corpus = read_corpus(corpus_dir)
-    if isinstance(tokenizer, (BPETokenizer, CustomHFTokenizer, CustomSPTokenizer)):
-        tokenizer.train(corpus_dir)
+def train_and_save_tokenizer(tokenizer, corpus_dir, vocab_file, num_workers=None, word_counts_file=None, recursive=False,
+                             max_vocab_size=None, min_freq=1, input_sentence_size=0, checkpoint_file=None,
+                             checkpoint_every=1000):
+    if isinstance(tokenizer, BPETokenizer):
+        tokenizer.train(corpus_dir, num_workers=num_workers, word_counts_file=word_counts_file, recursive=recursive,
+                        checkpoint_file=checkpoint_file, checkpoint_every=checkpoint_every)
+    elif isinstance(tokenizer, CustomSPTokenizer):
+        tokenizer.train(corpus_dir, recursive=recursive, input_sentence_size=input_sentence_size, num_threads=num_workers)
+    elif isinstance(tokenizer, CustomHFTokenizer):
+        configure_parallelism(num_workers)
+        tokenizer.train(corpus_dir, recursive=recursive)
     else:
-        tokenizer.fit(corpus)
+        tokenizer.fit(iter_corpus(corpus_dir, recursive=recursive),
+                      max_vocab_size=max_vocab_size, min_freq=min_freq, num_workers=num_workers)
     
     tokenizer.save(vocab_file)
     print(f"Tokenizer trained and vocabulary saved to {vocab_file}")
 
-    # Clean up temporary files
-    cleanup_temp_files()
-
-def cleanup_temp_files():
-    temp_files = ['spm_model.model', 'spm_model.vocab', 'temp_corpus.txt']
-    for file in temp_files:
-        if os.path.exists(file):
-            os.remove(file)
-            print(f"Deleted temporary file: {file}")
-
 def load_and_use_tokenizer(tokenizer_class, vocab_file, sample_text):
     tokenizer = tokenizer_class()
     tokenizer.load(vocab_file)
@@ -49,24 +52,77 @@ def load_and_use_tokenizer(tokenizer_class, vocab_file, sample_text):
     decoded = tokenizer.decode(encoded)
     print(f"Decoded: {decoded}")
 
+def print_train_all_report(report):
+    print(f"\nSharded the corpus into {report['shard']['num_shards']} files in {report['shard']['wall_s']:.2f}s")
+    print(f"{'tokenizer':<12}{'wall (s)':>10}{'peak RSS (MB)':>15}{'workers peak (MB)':>19}  vocabulary")
+    serial = 0.0
+    for name, result in report.items():
+        if name in ("shard", "total"):
+            continue
+        if "error" in result:
+            print(f"{name:<12}failed: {result['error']}")
+            continue
+        serial += result["wall_s"]
+        print(f"{name:<12}{result['wall_s']:>10.2f}{result['peak_rss_mb']:>15.1f}"
+              f"{result['children_peak_rss_mb']:>19.1f}  {result['vocab_file']}")
+    print(f"Total wall time {report['total']['wall_s']:.2f}s (trainings one after another: {serial:.2f}s)")
+
 def main():
     parser = argparse.ArgumentParser(description="Tokenizer operations")
-    parser.add_argument("tokenizer", choices=["whitespace", "regex", "bpe", "hf", "sp"], help="Tokenizer to use")
-    parser.add_argument("operation", choices=["train", "use"], help="Operation to perform")
+    parser.add_argument("tokenizer", choices=["whitespace", "regex", "bpe", "hf", "sp", "all"], help="Tokenizer to use ('all' with train-all)")
+    parser.add_argument("operation", choices=["train", "use", "convert", "encode", "train-all", "update"], help="Operation to perform")
     parser.add_argument("--vocab_file", default="vocab", help="Vocabulary file name (without extension)")
     parser.add_argument("--sample_text", default="This is a sample text.", help="Sample text for tokenization")
     parser.add_argument("--train_file", help="Path to the file containing training data")
+    parser.add_argument("--num_workers", type=int, default=None, help="Worker processes for token counting, or HF/SentencePiece training threads (default: all cores)")
+    parser.add_argument("--max_vocab_size", type=int, default=None, help="Keep only the most frequent tokens (whitespace/regex)")
+    parser.add_argument("--min_freq", type=int, default=1, help="Drop tokens seen fewer times (whitespace/regex)")
+    parser.add_argument("--word_counts_file", help="Word-frequency table to reuse across BPE trainings")
+    parser.add_argument("--recursive", action="store_true", help="Also read .txt files from subdirectories of the training corpus")
+    parser.add_argument("--pattern", default="basic", help="Regex tokenizer pattern name or regular expression")
+    parser.add_argument("--input_dir", help="Directory of .txt files to pretokenize with 'encode'")
+    parser.add_argument("--output_dir", help="Directory for the token shards written by 'encode', or the vocabularies written by 'train-all' (default: trained_vocabs)")
+    parser.add_argument("--dtype", choices=["uint16", "uint32"], help="Token ID type of the shards (default: smallest that fits)")
+    parser.add_argument("--lines_as_documents", action="store_true", help="Treat every non-empty line as a document instead of every file")
+    parser.add_argument("--input_sentence_size", type=int, default=0, help="Train SentencePiece on a random sample of this many sentences (0: all)")
+    parser.add_argument("--byte_level", action="store_true", help="Train the BPE tokenizer on UTF-8 bytes instead of characters")
+    parser.add_argument("--checkpoint_file", help="BPE merge-state checkpoint; training resumes from it when it exists")
+    parser.add_argument("--checkpoint_every", type=int, default=1000, help="Merges between BPE checkpoints")
+    parser.add_argument("--max_new_tokens", type=int, default=None, help="Add at most this many tokens with 'update' (whitespace/regex)")
     
     args = parser.parse_args()
 
     tokenizer_map = {
         "whitespace": WhitespaceTokenizer,
-        "regex": RegexTokenizer,
+        "regex": partial(RegexTokenizer, args.pattern),
         "bpe": BPETokenizer,
         "hf": CustomHFTokenizer,
         "sp": CustomSPTokenizer
     }
 
+    if args.operation == "train-all":
+        if not args.train_file:
+            raise ValueError("--train_file must be specified when using the 'train-all' operation")
+        output_dir = args.output_dir or "trained_vocabs"
+        os.makedirs(output_dir, exist_ok=True)
+        names = list(tokenizer_map) if args.tokenizer == "all" else [args.tokenizer]
+        if args.byte_level:
+            tokenizer_map["bpe"] = partial(BPETokenizer, byte_level=True)
+        regex_name = f"regex_vocab_{args.pattern}" if args.pattern in RegexTokenizer.PATTERNS else "regex_vocab"
+        options = {"word_counts_file": args.word_counts_file, "max_vocab_size": args.max_vocab_size,
+                   "min_freq": args.min_freq, "input_sentence_size": args.input_sentence_size}
+        backends = {}
+        for name in names:
+            base_name = regex_name if name == "regex" else f"{name}_vocab"
+            vocab_file = get_vocab_file_with_extension(name, os.path.join(output_dir, base_name))
+            backends[name] = (tokenizer_map[name], vocab_file, options)
+        report = train_all(train_and_save_tokenizer, backends, args.train_file,
+                           num_workers=args.num_workers, recursive=args.recursive)
+        print_train_all_report(report)
+        return
+    if args.tokenizer == "all":
+        raise ValueError("'all' can only be used with the 'train-all' operation")
+
     tokenizer_class = tokenizer_map[args.tokenizer]
     vocab_file = get_vocab_file_with_extension(args.tokenizer, args.vocab_file)
     
@@ -74,8 +130,28 @@ def main():
         if not args.train_file:
             raise ValueError("--train_file must be specified when using the 'train' operation")
         
+        tokenizer = BPETokenizer(byte_level=True) if args.byte_level and args.tokenizer == "bpe" else tokenizer_class()
+        train_and_save_tokenizer(tokenizer, args.train_file, vocab_file,
+                                 num_workers=args.num_workers, word_counts_file=args.word_counts_file,
+                                 recursive=args.recursive, max_vocab_size=args.max_vocab_size,
+                                 min_freq=args.min_freq, input_sentence_size=args.input_sentence_size,
+                                 checkpoint_file=args.checkpoint_file, checkpoint_every=args.checkpoint_every)
+
+    elif args.operation == "update":
+        if args.tokenizer not in ("whitespace", "regex"):
+            raise ValueError("Only the whitespace and regex tokenizers can be updated; resume BPE with --checkpoint_file")
+        if not args.train_file:
+            raise ValueError("--train_file must be specified when using the 'update' operation")
+        if not os.path.exists(vocab_file):
+            raise ValueError(f"Vocabulary file {vocab_file} does not exist. Train the tokenizer first.")
+
         tokenizer = tokenizer_class()
-        train_and_save_tokenizer(tokenizer, args.train_file, vocab_file)
+        tokenizer.load(vocab_file)
+        added = tokenizer.update(iter_corpus(args.train_file, recursive=args.recursive),
+                                 max_new_tokens=args.max_new_tokens, min_freq=args.min_freq,
+                                 num_workers=args.num_workers)
+        tokenizer.save(vocab_file)
+        print(f"Added {added} tokens; vocabulary of {len(tokenizer.vocab)} saved to {vocab_file}")
 
     elif args.operation == "use":
         if not os.path.exists(vocab_file):
@@ -83,8 +159,28 @@ def main():
         
         load_and_use_tokenizer(tokenizer_class, vocab_file, args.sample_text)
 
-    # Clean up temporary files after both train and use operations
-    cleanup_temp_files()
+    elif args.operation == "convert":
+        if args.tokenizer not in ("whitespace", "regex", "bpe"):
+            raise ValueError("Only the whitespace, regex and bpe tokenizers have a legacy vocabulary format to convert")
+        legacy_file = f"{os.path.splitext(args.vocab_file)[0]}.txt"
+        if args.tokenizer == "bpe":
+            convert_vocab_file(legacy_file, vocab_file)
+        else:
+            tokenizer = tokenizer_class()
+            tokenizer.load(legacy_file)
+            tokenizer.save(vocab_file)
+
+    elif args.operation == "encode":
+        if not args.input_dir or not args.output_dir:
+            raise ValueError("--input_dir and --output_dir must be specified when using the 'encode' operation")
+        if not os.path.exists(vocab_file):
+            raise ValueError(f"Vocabulary file {vocab_file} does not exist. Train the tokenizer first.")
+
+        manifest = write_shards(tokenizer_class, vocab_file, args.input_dir, args.output_dir,
+                                dtype=args.dtype, num_workers=args.num_workers,
+                                recursive=args.recursive, lines_as_documents=args.lines_as_documents)
+        num_tokens = sum(shard["num_tokens"] for shard in manifest["shards"].values())
+        print(f"Wrote {len(manifest['shards'])} shards with {num_tokens} tokens to {args.output_dir}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,9 +1,21 @@
 from .whitespace_tokenizer import WhitespaceTokenizer
 from .regex_tokenizer import RegexTokenizer
 from .bpe_tokenizer import BPETokenizer
-from .custom_hf_tokenizer import CustomHFTokenizer
-from .custom_sp_tokenizer import CustomSPTokenizer
-from .utils import read_corpus, get_vocab, save_vocab, load_vocab
+from .utils import read_corpus, iter_corpus, count_words, get_vocab, save_vocab, load_vocab
+from .vocab_store import VocabStore
+import importlib
+
+# The Hugging Face and SentencePiece wrappers pull in their native libraries,
+# so they are only imported when first accessed.
+_LAZY_IMPORTS = {
+    'CustomHFTokenizer': '.custom_hf_tokenizer',
+    'CustomSPTokenizer': '.custom_sp_tokenizer',
+}
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     'WhitespaceTokenizer',
@@ -12,7 +24,10 @@ __all__ = [
     'CustomHFTokenizer',
     'CustomSPTokenizer',
     'read_corpus',
+    'iter_corpus',
+    'count_words',
     'get_vocab',
     'save_vocab',
-    'load_vocab'
+    'load_vocab',
+    'VocabStore'
 ]
\ No newline at end of file
@@ -0,0 +1,198 @@
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+from collections.abc import Mapping as MappingABC
+from array import array
+import os
+import mmap
+import struct
+import zlib
+from src.utils import little_endian, uint32_view
+from src.vocab_store import VocabStore, serialize as serialize_vocab
+
+# Binary model layout: header, then the vocabulary as an embedded VocabStore
+# (token -> ID), a second VocabStore of merge symbols that are not in the
+# vocabulary (IDs from num_tokens on; only legacy models have any), each
+# padded to 4 bytes, then num_merges (left, right, merged) uint32 symbol IDs
+# in rank order and the open-addressing hash table of rank + 1 (table_size,
+# 0 = empty) keyed by the (left, right) pair. The embedded stores carry their
+# own checksums; the header's CRC32 covers the merge and hash tables.
+MODEL_MAGIC = b'BPEM'
+MODEL_VERSION = 2
+MODEL_HEADER = '<4sHHIIIIII'
+FLAG_BYTE_LEVEL = 1
+
+
+def _align(size: int) -> int:
+    return (size + 3) & ~3
+
+
+def _pair_slot(first: int, second: int) -> int:
+    return (first * 0x9E3779B1) ^ second
+
+
+class BPEModel:
+    """Read-only BPE vocabulary and ranked merges stored in one contiguous buffer.
+
+    ``load`` maps the model file read-only, so worker processes loading the
+    same model share its pages, and nothing is parsed per entry. ``vocab`` is
+    a VocabStore and ``merges`` a rank-ordered view standing in for the
+    ``"first second" -> merged`` dict. Merge ranks are found by hashing the
+    pair of symbol IDs into a table; up to ``cache_size`` of them are memoized
+    in a plain dict, like VocabStore lookups.
+    """
+
+    def __init__(self, buffer, path: Optional[str] = None, cache_size: int = 1 << 16):
+        self._buffer = buffer
+        self.path = path
+        self.cache_size = cache_size
+        self._rank_cache: Dict[Tuple[int, int], Optional[int]] = {}
+        header_size = struct.calcsize(MODEL_HEADER)
+        magic, version, flags, num_tokens, vocab_bytes, symbols_bytes, num_merges, table_size, checksum = \
+            struct.unpack_from(MODEL_HEADER, buffer)
+        if magic != MODEL_MAGIC:
+            raise ValueError(f"Not a binary BPE model: {path or 'buffer'}")
+        if version != MODEL_VERSION:
+            raise ValueError(f"Unsupported BPE model version {version} in {path or 'buffer'}")
+        view = memoryview(buffer)
+        start = header_size
+        self.vocab = VocabStore(view[start:start + vocab_bytes], cache_size=cache_size)
+        start += _align(vocab_bytes)
+        self.symbols = VocabStore(view[start:start + symbols_bytes], cache_size=cache_size)
+        start += _align(symbols_bytes)
+        tables = view[start:start + 4 * (3 * num_merges + table_size)]
+        if zlib.crc32(tables) != checksum:
+            raise ValueError(f"Checksum mismatch in {path or 'buffer'}; the file is corrupt")
+        self._merges = uint32_view(tables[:12 * num_merges])
+        self._table = uint32_view(tables[12 * num_merges:])
+        self._mask = table_size - 1
+        self.byte_level = bool(flags & FLAG_BYTE_LEVEL)
+        self.num_tokens = num_tokens
+        self.num_merges = num_merges
+        self.merges = MergeList(self)
+
+    @classmethod
+    def from_dicts(cls, vocab: Mapping[str, int], merges: Mapping[str, str], byte_level: bool) -> 'BPEModel':
+        return cls(serialize(vocab, merges, byte_level))
+
+    @classmethod
+    def load(cls, path: str) -> 'BPEModel':
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, path)
+
+    def save(self, path: str) -> None:
+        # Written aside and renamed: the buffer may be a mapping of ``path`` itself
+        with open(path + '.tmp', 'wb') as f:
+            f.write(self._buffer)
+        os.replace(path + '.tmp', path)
+
+    def __reduce__(self):
+        # Worker processes map the file again rather than receiving a copy of it
+        if self.path is not None:
+            return BPEModel.load, (self.path,)
+        return BPEModel, (bytes(self._buffer),)
+
+    def symbol_id(self, symbol: str) -> Optional[int]:
+        """ID of a vocabulary token or of a merge symbol outside the vocabulary."""
+        id = self.vocab.get(symbol)
+        return self.symbols.get(symbol) if id is None else id
+
+    def symbol(self, id: int) -> Optional[str]:
+        return self.vocab.token(id) if id < self.num_tokens else self.symbols.token(id)
+
+    def rank(self, first: int, second: int) -> Optional[int]:
+        """Rank of the merge of symbol IDs ``first`` and ``second``, or None if they never merge."""
+        key = (first, second)
+        try:
+            return self._rank_cache[key]
+        except KeyError:
+            pass
+        rank = self._lookup(first, second)
+        if len(self._rank_cache) < self.cache_size:
+            self._rank_cache[key] = rank
+        return rank
+
+    def _lookup(self, first: int, second: int) -> Optional[int]:
+        merges, table, mask = self._merges, self._table, self._mask
+        slot = _pair_slot(first, second) & mask
+        while True:
+            entry = table[slot]
+            if entry == 0:
+                return None
+            index = 3 * (entry - 1)
+            if merges[index] == first and merges[index + 1] == second:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def merged(self, rank: int) -> int:
+        """Symbol ID produced by the merge of the given rank."""
+        return self._merges[3 * rank + 2]
+
+    def merge_ids(self, rank: int) -> Tuple[int, int, int]:
+        index = 3 * rank
+        return self._merges[index], self._merges[index + 1], self._merges[index + 2]
+
+
+class MergeList(MappingABC):
+    """``"first second" -> merged`` view of a BPEModel's merges, in rank order, replacing the ``merges`` dict."""
+
+    def __init__(self, model: BPEModel):
+        self.model = model
+
+    def __len__(self) -> int:
+        return self.model.num_merges
+
+    def __iter__(self) -> Iterator[str]:
+        for bigram, _ in self.items():
+            yield bigram
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        symbol = self.model.symbol
+        for rank in range(self.model.num_merges):
+            first, second, merged = self.model.merge_ids(rank)
+            yield f"{symbol(first)} {symbol(second)}", symbol(merged)
+
+    def __getitem__(self, bigram: str) -> str:
+        first, _, second = bigram.partition(' ')
+        first_id, second_id = self.model.symbol_id(first), self.model.symbol_id(second)
+        rank = None if first_id is None or second_id is None else self.model.rank(first_id, second_id)
+        if rank is None:
+            raise KeyError(bigram)
+        return self.model.symbol(self.model.merged(rank))
+
+
+def serialize(vocab: Mapping[str, int], merges: Mapping[str, str], byte_level: bool) -> bytes:
+    """Encode a vocabulary and ``"first second" -> merged`` merges in the layout described by MODEL_HEADER."""
+    num_tokens = max(vocab.values()) + 1 if vocab else 0
+    symbols: Dict[str, int] = {}
+
+    def symbol_id(symbol: str) -> int:
+        id = vocab.get(symbol)
+        if id is None:
+            # Legacy models may merge symbols that never made it into the vocab
+            id = symbols.setdefault(symbol, num_tokens + len(symbols))
+        return id
+
+    merge_table = array('I')
+    for bigram, merged in merges.items():
+        first, second = bigram.split(' ')
+        merge_table.extend((symbol_id(first), symbol_id(second), symbol_id(merged)))
+    num_merges = len(merge_table) // 3
+
+    # Power-of-two table at most half full, so probe sequences stay short
+    table_size = 8
+    while table_size < 2 * num_merges:
+        table_size *= 2
+    table = array('I', [0]) * table_size
+    mask = table_size - 1
+    for rank in range(num_merges):
+        slot = _pair_slot(merge_table[3 * rank], merge_table[3 * rank + 1]) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = rank + 1
+
+    vocab_blob, symbols_blob = serialize_vocab(vocab), serialize_vocab(symbols)
+    tables = little_endian(merge_table) + little_endian(table)
+    header = struct.pack(MODEL_HEADER, MODEL_MAGIC, MODEL_VERSION, FLAG_BYTE_LEVEL if byte_level else 0,
+                         num_tokens, len(vocab_blob), len(symbols_blob), num_merges, table_size, zlib.crc32(tables))
+    return b''.join([header, vocab_blob, b'\0' * (_align(len(vocab_blob)) - len(vocab_blob)),
+                     symbols_blob, b'\0' * (_align(len(symbols_blob)) - len(symbols_blob)), tables])
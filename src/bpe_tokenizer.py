@@ -1,122 +1,508 @@
-from typing import List, Dict, Tuple
-from collections import defaultdict
+from typing import List, Dict, Iterable, Iterator, Tuple, Optional
+import numpy as np
+from src.utils import count_words, encode_batch_in_processes, byte_to_char_offsets, LRUCache, Encoding, Chunk, window_tokens, uint32_view
+from src.metrics import instrumented
+from src.bpe_trainer import BPETrainer
+from src.regex_tokenizer import RegexTokenizer
+from src.decode_stream import TextDecodeStream, ByteDecodeStream, decode_table
+from src.bpe_model import BPEModel, MODEL_MAGIC, MODEL_VERSION
+from src.vocab_store import VocabStore
+import regex
 import re
-from src.utils import read_corpus, save_vocab, load_vocab
 import json
+import ast
+import os
+import struct
+import zlib
 
+
+def bytes_to_unicode() -> Dict[int, str]:
+    """GPT-2 mapping from bytes to printable unicode characters, as used by the
+    ByteLevel pre-tokenizer of the Hugging Face tokenizers library."""
+    bs = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    cs = bs[:]
+    n = 0
+    for b in range(256):
+        if b not in bs:
+            bs.append(b)
+            cs.append(256 + n)
+            n += 1
+    return dict(zip(bs, map(chr, cs)))
+
+
+# Version 1 of the binary model, read for compatibility: header, then uint32
+# string offsets (num_strings + 1), the UTF-8 string blob, and num_merges
+# (left, right, merged) uint32 string indices in rank order. The first
+# num_tokens strings are the vocab by ID. The CRC32 covers everything after
+# the header. It is parsed into dicts; saving it again writes the mapped
+# layout of src.bpe_model.
+LEGACY_MODEL_VERSION = 1
+LEGACY_MODEL_HEADER = '<4sHHIIIII'
+
+CHECKPOINT_VERSION = 1
+
+# Words as produced by str.split(); the stdlib re module agrees with str.isspace()
+WORD = re.compile(r'\S+')
+
+BYTE_ENCODER = bytes_to_unicode()
+BYTE_DECODER = {c: b for b, c in BYTE_ENCODER.items()}
+
+
+@instrumented('bpe')
 class BPETokenizer:
-    def __init__(self, vocab_size: int = 1000):
+    SPECIAL_TOKENS = ["<unk>", "<s>", "</s>"]
+
+    def __init__(self, vocab_size: int = 1000, cache_size: int = 10000, byte_level: bool = False):
         self.vocab_size = vocab_size
-        self.vocab = {"<unk>": 0, "<s>": 1, "</s>": 2}
-        self.inverse_vocab = {0: "<unk>", 1: "<s>", 2: "</s>"}
+        self.byte_level = byte_level
+        self.vocab = {token: i for i, token in enumerate(self.SPECIAL_TOKENS)}
+        self.inverse_vocab = {i: token for token, i in self.vocab.items()}
+        if byte_level:
+            # Every byte is a base symbol, so any UTF-8 input round-trips without <unk>
+            for b in range(256):
+                self.vocab[BYTE_ENCODER[b]] = len(self.vocab)
+                self.inverse_vocab[self.vocab[BYTE_ENCODER[b]]] = BYTE_ENCODER[b]
+        self.pattern = regex.compile(RegexTokenizer.PATTERNS['gpt2'])
         self.merges = {}
+        self.cache = LRUCache(cache_size)
+        self._pack_model()
 
-    def train(self, corpus_dir: str):
-        corpus = read_corpus(corpus_dir)
-        word_freqs = defaultdict(int)
-        for word in corpus.split():
-            word = ' '.join(word) + ' </w>'
-            word_freqs[word] += 1
-
-        for word in word_freqs:
-            for char in word.split():
-                if char not in self.vocab:
-                    self.vocab[char] = len(self.vocab)
-                    self.inverse_vocab[self.vocab[char]] = char
-
-        num_merges = self.vocab_size - len(self.vocab)
-        for i in range(num_merges):
-            pairs = self._get_stats(word_freqs)
-            if not pairs:
-                break
-            best = max(pairs, key=pairs.get)
-            self._merge_vocab(best, word_freqs)
-            if len(self.vocab) >= self.vocab_size:
-                break
+    def train(self, corpus_dir: str, num_workers: Optional[int] = None, word_counts_file: Optional[str] = None,
+              recursive: bool = False, checkpoint_file: Optional[str] = None, checkpoint_every: int = 1000):
+        """Train on a corpus directory.
+
+        Word counting runs on a process pool; pass ``word_counts_file`` to
+        persist the table so later runs with another vocab_size reuse it.
+        In byte-level mode words are GPT-2 pre-tokens, with their spaces.
+        With ``checkpoint_file`` the merge state is saved every
+        ``checkpoint_every`` merges and at the end; if the file exists,
+        training resumes from it instead of reading the corpus.
+        """
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            self.resume(checkpoint_file, checkpoint_every)
+            return
+        pattern = RegexTokenizer.PATTERNS['gpt2'] if self.byte_level else None
+        word_freqs = count_words(corpus_dir, num_workers=num_workers, cache_file=word_counts_file,
+                                 pattern=pattern, recursive=recursive)
+        self.train_from_word_counts(word_freqs, checkpoint_file, checkpoint_every)
+
+    def train_from_word_counts(self, word_freqs: Dict[str, int], checkpoint_file: Optional[str] = None,
+                               checkpoint_every: int = 1000):
+        """Learn merges from a precomputed word-frequency table."""
+        if isinstance(self.vocab, VocabStore):
+            # The packed model is read-only; training extends dict copies of it
+            self.vocab = dict(self.vocab.items())
+            self.inverse_vocab = {id: token for token, id in self.vocab.items()}
+            self.merges = dict(self.merges.items())
+        if self.byte_level:
+            # Merges over integer symbol IDs, starting from the 256 byte symbols
+            words = [self._byte_ids(word) for word in word_freqs]
+        else:
+            words = [tuple(word) + ('</w>',) for word in word_freqs]
+            for symbols in words:
+                for char in symbols:
+                    if char not in self.vocab:
+                        self.vocab[char] = len(self.vocab)
+                        self.inverse_vocab[self.vocab[char]] = char
+
+        merge_budget = self.vocab_size - len(self.vocab)
+        self._learn_merges(words, list(word_freqs.values()), merge_budget, checkpoint_file, checkpoint_every)
+
+    def resume(self, checkpoint_file: str, checkpoint_every: int = 1000):
+        """Continue training from a checkpoint written by ``train``.
+
+        The vocabulary, merges and partly merged word table are restored, and
+        merging goes on until this tokenizer's ``vocab_size``, which may be
+        larger than the checkpointed run's to extend a finished model.
+        """
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state['version'] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported BPE checkpoint version {state['version']} in {checkpoint_file}")
+        self.byte_level = state['byte_level']
+        self.vocab = {token: id for id, token in enumerate(state['vocab'])}
+        self.inverse_vocab = dict(enumerate(state['vocab']))
+        self.merges = dict(state['merges'])
+        print(f"Resuming from {len(self.merges)} merges in {checkpoint_file}")
+        merge_budget = state['merge_budget'] + self.vocab_size - state['vocab_size']
+        self._learn_merges(state['words'], state['freqs'], merge_budget, checkpoint_file, checkpoint_every)
 
-    def _get_stats(self, word_freqs: Dict[str, int]) -> Dict[Tuple[str, str], int]:
-        pairs = defaultdict(int)
-        for word, freq in word_freqs.items():
-            symbols = word.split()
-            for i in range(len(symbols) - 1):
-                pairs[symbols[i], symbols[i + 1]] += freq
-        return pairs
-
-    def _merge_vocab(self, pair: Tuple[str, str], word_freqs: Dict[str, int]):
-        bigram = ' '.join(pair)
-        replacement = ''.join(pair)
-        self.merges[bigram] = replacement
-        self.vocab[replacement] = len(self.vocab)
-        self.inverse_vocab[self.vocab[replacement]] = replacement
-        
-        new_word_freqs = {}
-        for word, freq in word_freqs.items():
-            new_word = word.replace(bigram, replacement)
-            new_word_freqs[new_word] = freq
-        word_freqs.clear()
-        word_freqs.update(new_word_freqs)
+    def _learn_merges(self, words, freqs: List[int], merge_budget: int,
+                      checkpoint_file: Optional[str], checkpoint_every: int):
+        """Merge until ``merge_budget`` merges exist in total or the vocabulary is full."""
+        num_merges = merge_budget - len(self.merges)
+        if num_merges > 0 and len(self.vocab) < self.vocab_size:
+            trainer = BPETrainer(words, freqs, typecode='I' if self.byte_level else None)
+
+            def on_merge(pair, symbol) -> bool:
+                if self.byte_level:
+                    # _add_id_merge already recorded the merge
+                    keep_going = len(self.vocab) < self.vocab_size
+                else:
+                    keep_going = self._add_merge(pair, symbol)
+                if checkpoint_file and len(self.merges) % checkpoint_every == 0:
+                    self._save_checkpoint(checkpoint_file, trainer, merge_budget)
+                return keep_going
+
+            trainer.train(num_merges, make_symbol=self._add_id_merge if self.byte_level else ''.join,
+                          on_merge=on_merge)
+            if checkpoint_file:
+                self._save_checkpoint(checkpoint_file, trainer, merge_budget)
+        self._pack_model()
+
+    def _save_checkpoint(self, checkpoint_file: str, trainer: BPETrainer, merge_budget: int):
+        """Write the merge state and the partly merged word-frequency table, atomically."""
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'byte_level': self.byte_level,
+            'vocab_size': self.vocab_size,
+            'merge_budget': merge_budget,
+            'vocab': [self.inverse_vocab[id] for id in range(len(self.inverse_vocab))],
+            'merges': list(self.merges.items()),
+            'words': [list(symbols) for symbols in trainer.words],
+            'freqs': trainer.freqs,
+        }
+        with open(checkpoint_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+    def _add_id_merge(self, pair: Tuple[int, int]) -> int:
+        """Record a merge of two symbol IDs and return the ID of the merged symbol."""
+        first, second = self.inverse_vocab[pair[0]], self.inverse_vocab[pair[1]]
+        self._add_merge((first, second), first + second)
+        return self.vocab[first + second]
+
+    def _byte_ids(self, word: str) -> List[int]:
+        byte_id = self._byte_id
+        return [byte_id[b] for b in word.encode('utf-8')]
+
+    def _add_merge(self, pair: Tuple[str, str], replacement: str) -> bool:
+        """Record a learned merge; returns False once the vocabulary is full."""
+        self.merges[' '.join(pair)] = replacement
+        if replacement not in self.vocab:
+            self.vocab[replacement] = len(self.vocab)
+            self.inverse_vocab[self.vocab[replacement]] = replacement
+        return len(self.vocab) < self.vocab_size
 
     def tokenize(self, text: str) -> List[str]:
-        words = text.lower().split()
+        if self.byte_level:
+            return [self.inverse_vocab[id] for id in self.encode(text)]
         tokens = []
-        for word in words:
-            word = ' '.join(word) + ' </w>'
-            while True:
-                subwords = word.split()
-                if len(subwords) == 1:
-                    break
-                i = 0
-                while i < len(subwords) - 1:
-                    bigram = ' '.join(subwords[i:i+2])
-                    if bigram in self.merges:
-                        subwords[i] = self.merges[bigram]
-                        del subwords[i+1]
-                    else:
-                        i += 1
-                new_word = ' '.join(subwords)
-                if new_word == word:
-                    break
-                word = new_word
-            tokens.extend(word.split())
+        for word in text.lower().split():
+            tokens.extend(self._bpe(word)[0])
         return tokens
 
+    def encode_full(self, text: str) -> Encoding:
+        """Tokens, IDs and character offsets from a single pass over the text.
+
+        Character-level subwords map back onto their word; ``</w>`` takes no
+        characters. If lowercasing changes a word's length, all its subwords
+        get the whole word's span.
+        """
+        tokens, ids, offsets = [], [], []
+        if self.byte_level:
+            for match in self.pattern.finditer(text):
+                word = match.group()
+                char_at = byte_to_char_offsets(word)
+                pos = 0
+                for id in self._bpe_ids(word):
+                    token = self.inverse_vocab[id]
+                    # Each character of a byte-level token stands for one byte
+                    size = len(token)
+                    tokens.append(token)
+                    ids.append(id)
+                    # A token may hold part of a multi-byte character; widen it to whole characters
+                    offsets.append((match.start() + char_at[pos], match.start() + char_at[pos + size - 1] + 1))
+                    pos += size
+            return Encoding(tokens, ids, offsets)
+
+        for match in WORD.finditer(text):
+            word = match.group().lower()
+            start, end = match.span()
+            aligned = len(word) == end - start
+            pos = start
+            for subword, id in zip(*self._bpe(word)):
+                size = len(subword) - 4 if subword.endswith('</w>') else len(subword)
+                tokens.append(subword)
+                ids.append(id)
+                offsets.append((pos, pos + size) if aligned else (start, end))
+                pos += size
+        return Encoding(tokens, ids, offsets)
+
+    def _iter_offsets(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield (id, start, end) word by word, with the offsets of encode_full.
+
+        Kept apart from encode_full, which is faster filling its lists directly.
+        """
+        if self.byte_level:
+            for match in self.pattern.finditer(text):
+                word = match.group()
+                char_at = byte_to_char_offsets(word)
+                pos = 0
+                for id in self._bpe_ids(word):
+                    size = len(self.inverse_vocab[id])
+                    yield id, match.start() + char_at[pos], match.start() + char_at[pos + size - 1] + 1
+                    pos += size
+            return
+
+        for match in WORD.finditer(text):
+            word = match.group().lower()
+            start, end = match.span()
+            aligned = len(word) == end - start
+            pos = start
+            for subword, id in zip(*self._bpe(word)):
+                size = len(subword) - 4 if subword.endswith('</w>') else len(subword)
+                if aligned:
+                    yield id, pos, pos + size
+                else:
+                    yield id, start, end
+                pos += size
+
+    def chunk(self, text: str, max_tokens: int, stride: int = 0) -> Iterator[Chunk]:
+        """Windows of at most ``max_tokens`` IDs with their character spans, overlapping by ``stride`` tokens.
+
+        Words are segmented as the windows are consumed, so only the current
+        window is held.
+        """
+        return window_tokens(self._iter_offsets(text), max_tokens, stride)
+
+    def _best_rank(self, ids) -> Optional[int]:
+        """Lowest merge rank among adjacent symbol IDs; None (an unknown symbol) never merges."""
+        rank = self.model.rank
+        best = None
+        for first, second in set(zip(ids, ids[1:])):
+            if first is None or second is None:
+                continue
+            found = rank(first, second)
+            if found is not None and (best is None or found < best):
+                best = found
+        return best
+
+    def _bpe(self, word: str) -> Tuple[List[str], List[int]]:
+        """Split a single word into subwords, applying merges in learned order.
+
+        Returns the subwords and their token IDs, ``<unk>`` for subwords
+        outside the vocabulary; both are cached per word.
+        """
+        cached = self.cache.get(word)
+        if cached is not None:
+            return cached
+        symbols = list(word) + ['</w>']
+        # Symbol IDs alongside the strings, for the model's merge lookups
+        ids = [self.model.symbol_id(symbol) for symbol in symbols]
+        while len(symbols) > 1:
+            best = self._best_rank(ids)
+            if best is None:
+                break
+            first, second, new_id = self.model.merge_ids(best)
+            merged, merged_ids = [], []
+            i = 0
+            while i < len(symbols):
+                if i < len(symbols) - 1 and ids[i] == first and ids[i + 1] == second:
+                    merged.append(symbols[i] + symbols[i + 1])
+                    merged_ids.append(new_id)
+                    i += 2
+                else:
+                    merged.append(symbols[i])
+                    merged_ids.append(ids[i])
+                    i += 1
+            symbols, ids = merged, merged_ids
+        # Merge symbols outside the vocabulary have IDs from num_tokens on
+        unk_id, num_tokens = self.vocab["<unk>"], self.model.num_tokens
+        segmented = symbols, [unk_id if id is None or id >= num_tokens else id for id in ids]
+        self.cache.put(word, segmented)
+        return segmented
+
+    def _bpe_ids(self, word: str) -> List[int]:
+        """Byte-level counterpart of _bpe: merge integer symbol pairs in learned order."""
+        cached = self.cache.get(word)
+        if cached is not None:
+            return cached
+        ids = self._byte_ids(word)
+        while len(ids) > 1:
+            best = self._best_rank(ids)
+            if best is None:
+                break
+            first, second, new_id = self.model.merge_ids(best)
+            merged = []
+            i = 0
+            while i < len(ids):
+                if i < len(ids) - 1 and ids[i] == first and ids[i + 1] == second:
+                    merged.append(new_id)
+                    i += 2
+                else:
+                    merged.append(ids[i])
+                    i += 1
+            ids = merged
+        self.cache.put(word, ids)
+        return ids
+
+    def _pack_model(self):
+        """Pack the vocab and merges into a BPEModel and drop cached segmentations from the previous model."""
+        self._use_model(BPEModel.from_dicts(self.vocab, self.merges, self.byte_level))
+        self.cache.clear()
+
+    def _use_model(self, model: BPEModel):
+        """Serve the vocab, merges and merge ranks from ``model``."""
+        self.model = model
+        self.byte_level = model.byte_level
+        self.vocab = model.vocab
+        self.inverse_vocab = model.vocab.inverse
+        self.merges = model.merges
+        self._byte_id = [model.vocab.get(BYTE_ENCODER[b]) for b in range(256)]
+        self._decode_table = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if isinstance(self.vocab, VocabStore):
+            # Rebuilt from the model, which a worker process maps from its file again
+            for name in ('vocab', 'inverse_vocab', 'merges', '_byte_id', '_decode_table'):
+                del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'vocab' not in state:
+            self._use_model(self.model)
+
+    def decode_table(self) -> list:
+        """ID -> token text (token bytes in byte-level mode) with ``</w>`` already turned into a space.
+
+        Built on first use, so processes that only encode never hold it.
+        """
+        if self._decode_table is None:
+            if self.byte_level:
+                table = [b''] * (max(self.inverse_vocab) + 1 if self.inverse_vocab else 0)
+                for id, token in self.inverse_vocab.items():
+                    if token not in self.SPECIAL_TOKENS:
+                        table[id] = bytes(BYTE_DECODER[c] for c in token)
+            else:
+                table = [token.replace('<w>', '').replace('</w>', ' ')
+                         for token in decode_table(self.inverse_vocab)]
+            self._decode_table = table
+        return self._decode_table
+
+    def cache_info(self) -> Dict[str, int]:
+        """Hit/miss counters of the per-word segmentation cache."""
+        return self.cache.info()
+
     def encode(self, text: str) -> List[int]:
         """Encode the input text into token IDs."""
-        tokens = self.tokenize(text)
-        return [self.vocab.get(token, self.vocab["<unk>"]) for token in tokens]
+        if self.byte_level:
+            return [id for word in self.pattern.findall(text) for id in self._bpe_ids(word)]
+        return [id for word in text.lower().split() for id in self._bpe(word)[1]]
+
+    def encode_batch(self, texts: List[str], num_workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode many texts on a process pool into a flat int32 ID array plus offsets."""
+        return encode_batch_in_processes(self, texts, num_workers)
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens encode() would return, summed from the cached segmentation of each word."""
+        if self.byte_level:
+            return sum(len(self._bpe_ids(match.group())) for match in self.pattern.finditer(text))
+        return sum(len(self._bpe(match.group())[1]) for match in WORD.finditer(text.lower()))
+
+    def count_tokens_batch(self, texts: Iterable[str]) -> List[int]:
+        """Token count of each text."""
+        return [self.count_tokens(text) for text in texts]
 
     def decode(self, token_ids: List[int]) -> str:
         """Decode the token IDs back into text."""
-        tokens = [self.inverse_vocab.get(id, "<unk>") for id in token_ids]
-        return self.detokenize(tokens)
+        table = self.decode_table()
+        size = len(table)
+        if self.byte_level:
+            return b''.join([table[id] for id in token_ids if 0 <= id < size]).decode('utf-8', errors='replace')
+        return ''.join([table[id] if 0 <= id < size else '<unk>' for id in token_ids]).strip()
+
+    def decode_stream(self):
+        """Incremental decoder whose ``step(id)`` returns the text each new ID adds.
+
+        Byte-level tokens may split a UTF-8 character; its bytes are held
+        until the character is complete. Character-level output is stripped
+        like ``decode``, so a trailing ``</w>`` space appears only once more
+        text follows it.
+        """
+        if self.byte_level:
+            return ByteDecodeStream(self.decode_table())
+        return TextDecodeStream(self.decode_table(), strip=True)
 
     def detokenize(self, tokens: List[str]) -> str:
         """Detokenize the input tokens."""
+        if self.byte_level:
+            return self.decode([self.vocab[token] for token in tokens if token in self.vocab])
         text = ''.join(tokens)
         text = text.replace("<w>", "").replace("</w>", " ").strip()
         return text
     
     def save(self, vocab_file):
-        data_to_save = {
-            'vocab': {repr(k): v for k, v in self.vocab.items()},
-            'merges': self.merges
-        }
-        with open(vocab_file, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=2)
+        """Save the model in the binary format described by src.bpe_model.MODEL_HEADER."""
+        self.model.save(vocab_file)
         print(f"\nVocabulary and merges saved to {vocab_file}")
 
     def load(self, vocab_file):
+        """Map a binary model, or load a version 1 binary or legacy JSON vocab file into a packed model."""
+        with open(vocab_file, 'rb') as f:
+            magic, version = struct.unpack('<4sH', f.read(6).ljust(6, b'\0'))
+        if magic == MODEL_MAGIC and version == MODEL_VERSION:
+            self._use_model(BPEModel.load(vocab_file))
+            self.cache.clear()
+        else:
+            if magic == MODEL_MAGIC:
+                self._load_binary_v1(vocab_file)
+            else:
+                self._load_json(vocab_file)
+            self._pack_model()
+
+        print(f"Loaded vocabulary with {len(self.vocab)} tokens and {len(self.merges)} merges")
+
+    def _load_binary_v1(self, vocab_file):
+        with open(vocab_file, 'rb') as f:
+            data = f.read()
+        header_size = struct.calcsize(LEGACY_MODEL_HEADER)
+        magic, version, flags, num_tokens, num_strings, num_merges, blob_size, checksum = \
+            struct.unpack_from(LEGACY_MODEL_HEADER, data)
+        if version != LEGACY_MODEL_VERSION:
+            raise ValueError(f"Unsupported BPE model version {version} in {vocab_file}")
+        view = memoryview(data)[header_size:]
+        if zlib.crc32(view) != checksum:
+            raise ValueError(f"Checksum mismatch in {vocab_file}; the file is corrupt")
+
+        offsets_size = 4 * (num_strings + 1)
+        offsets = uint32_view(view[:offsets_size])
+        blob = view[offsets_size:offsets_size + blob_size]
+        strings = [str(blob[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(num_strings)]
+        merge_table = uint32_view(view[offsets_size + blob_size:offsets_size + blob_size + 12 * num_merges])
+
+        self.byte_level = bool(flags & 1)
+        self.vocab = {}
+        self.inverse_vocab = {}
+        for id in range(num_tokens):
+            if strings[id]:
+                self.vocab[strings[id]] = id
+                self.inverse_vocab[id] = strings[id]
+        self.merges = {}
+        for i in range(0, 3 * num_merges, 3):
+            self.merges[f"{strings[merge_table[i]]} {strings[merge_table[i + 1]]}"] = strings[merge_table[i + 2]]
+
+    def _load_json(self, vocab_file):
         with open(vocab_file, 'r', encoding='utf-8') as f:
             loaded_data = json.load(f)
-        
+
         self.vocab = {}
         self.inverse_vocab = {}
         for k, v in loaded_data['vocab'].items():
-            token = eval(k)
+            token = ast.literal_eval(k)
             id = int(v)
             self.vocab[token] = id
             self.inverse_vocab[id] = token
-        
+
         self.merges = loaded_data['merges']
+        self.byte_level = loaded_data.get('byte_level', False)
 
-        print(f"Loaded vocabulary with {len(self.vocab)} tokens and {len(self.merges)} merges")
+
+def convert_vocab_file(json_file: str, binary_file: str) -> BPETokenizer:
+    """Convert a legacy JSON ``bpe_vocab.txt`` into the binary model format."""
+    tokenizer = BPETokenizer()
+    tokenizer.load(json_file)
+    tokenizer.save(binary_file)
+    return tokenizer
@@ -0,0 +1,142 @@
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+from collections import defaultdict
+from array import array
+import heapq
+import time
+
+Pair = Tuple[Hashable, Hashable]
+
+
+class BPETrainer:
+    """Incremental BPE merge learner.
+
+    Instead of recounting every pair on every merge, the trainer keeps the
+    pair counts and an index from each pair to the words containing it, so a
+    merge only revisits the words it actually touches. The most frequent pair
+    is taken from a max-heap with lazy invalidation. Ties are broken by first
+    occurrence in the corpus, which matches the ``max(pairs, key=pairs.get)``
+    scan of the original trainer: the heap key is ``(-count, word index,
+    position)`` of each pair's first occurrence, kept up to date as merges
+    change the words, so one valid pop is the best pair.
+
+    Words are lists of symbols, or compact ``array.array`` objects when a
+    ``typecode`` is given for integer symbols.
+    """
+
+    def __init__(self, words: Sequence[Sequence[Hashable]], freqs: Sequence[int], typecode: Optional[str] = None):
+        self.typecode = typecode
+        self.words = [array(typecode, word) if typecode else list(word) for word in words]
+        self.freqs: List[int] = list(freqs)
+        self.pair_counts: Dict[Pair, int] = defaultdict(int)
+        self.pair_words: Dict[Pair, Set[int]] = defaultdict(set)
+        # (word index, position) of each pair's first occurrence, the heap's tie-break
+        self.first_seen: Dict[Pair, Tuple[int, int]] = {}
+        for idx, (symbols, freq) in enumerate(zip(self.words, self.freqs)):
+            for pos, pair in enumerate(zip(symbols, symbols[1:])):
+                self.pair_counts[pair] += freq
+                self.pair_words[pair].add(idx)
+                if pair not in self.first_seen:
+                    self.first_seen[pair] = (idx, pos)
+        self.heap = [(-count, *self.first_seen[pair], pair) for pair, count in self.pair_counts.items()]
+        heapq.heapify(self.heap)
+
+    @staticmethod
+    def _position(pair: Pair, symbols) -> int:
+        first, second = pair
+        for pos in range(len(symbols) - 1):
+            if symbols[pos] == first and symbols[pos + 1] == second:
+                return pos
+        return len(symbols)
+
+    def _first_occurrence(self, pair: Pair) -> Tuple[int, int]:
+        idx = min(self.pair_words[pair])
+        return idx, self._position(pair, self.words[idx])
+
+    def best_pair(self) -> Optional[Pair]:
+        """Return the most frequent pair, or None when nothing is left to merge."""
+        while self.heap:
+            neg_count, idx, pos, pair = heapq.heappop(self.heap)
+            if self.pair_counts.get(pair, 0) == -neg_count and self.first_seen.get(pair) == (idx, pos):
+                return pair
+        return None
+
+    def merge(self, pair: Pair, new_symbol: Hashable):
+        """Replace every occurrence of ``pair`` with ``new_symbol`` in the words that contain it."""
+        first, second = pair
+        changed = set()
+        # Lowest touched word index per changed pair; only those words can move a first occurrence
+        touched: Dict[Pair, int] = {}
+        for idx in list(self.pair_words.get(pair, ())):
+            symbols = self.words[idx]
+            freq = self.freqs[idx]
+            merged = []
+            i = 0
+            while i < len(symbols):
+                if i < len(symbols) - 1 and symbols[i] == first and symbols[i + 1] == second:
+                    merged.append(new_symbol)
+                    i += 2
+                else:
+                    merged.append(symbols[i])
+                    i += 1
+
+            old_pairs = list(zip(symbols, symbols[1:]))
+            new_pairs = list(zip(merged, merged[1:]))
+            for p in old_pairs:
+                self.pair_counts[p] -= freq
+            for p in new_pairs:
+                self.pair_counts[p] += freq
+            old_set, new_set = set(old_pairs), set(new_pairs)
+            for p in old_set - new_set:
+                self.pair_words[p].discard(idx)
+            for p in new_set - old_set:
+                self.pair_words[p].add(idx)
+            changed.update(old_set)
+            changed.update(new_set)
+            for p in old_set | new_set:
+                if idx < touched.get(p, len(self.words)):
+                    touched[p] = idx
+            self.words[idx] = array(self.typecode, merged) if self.typecode else merged
+
+        for p in changed:
+            count = self.pair_counts.get(p, 0)
+            if count <= 0:
+                self.pair_counts.pop(p, None)
+                self.pair_words.pop(p, None)
+                self.first_seen.pop(p, None)
+                continue
+            key = self.first_seen.get(p)
+            idx = touched[p]
+            if key is None or idx < key[0]:
+                # Appeared in a word before its previous first occurrence
+                key = (idx, self._position(p, self.words[idx]))
+            elif idx == key[0]:
+                if idx in self.pair_words[p]:
+                    key = (idx, self._position(p, self.words[idx]))
+                else:
+                    key = self._first_occurrence(p)
+            self.first_seen[p] = key
+            heapq.heappush(self.heap, (-count, *key, p))
+
+    def train(self, num_merges: int, make_symbol: Callable[[Pair], Hashable],
+              on_merge: Optional[Callable[[Pair, Hashable], bool]] = None) -> List[Tuple[Pair, Hashable]]:
+        """Learn up to ``num_merges`` merges and report the merge rate.
+
+        ``make_symbol`` builds the new symbol for a pair. ``on_merge`` is called
+        after each merge and may return False to stop early.
+        """
+        merges = []
+        start = time.perf_counter()
+        for _ in range(num_merges):
+            pair = self.best_pair()
+            if pair is None:
+                break
+            new_symbol = make_symbol(pair)
+            self.merge(pair, new_symbol)
+            merges.append((pair, new_symbol))
+            if on_merge is not None and on_merge(pair, new_symbol) is False:
+                break
+        elapsed = time.perf_counter() - start
+        rate = len(merges) / elapsed if elapsed > 0 else float('inf')
+        self.merges_per_sec = rate
+        print(f"Learned {len(merges)} merges in {elapsed:.2f}s ({rate:.1f} merges/sec)")
+        return merges
@@ -1,8 +1,50 @@
+import os
+import json
 from tokenizers import Tokenizer, models, pre_tokenizers, processors, decoders, trainers
-from src.utils import read_corpus
+from src.utils import iter_corpus_batches, pack_ids, window_tokens, Encoding
+from src.decode_stream import ByteDecodeStream
+from src.bpe_tokenizer import BYTE_DECODER
+from src.metrics import instrumented
 
+
+def configure_parallelism(num_threads=None):
+    """Set the size of the Rust thread pool used for training and batch encoding.
+
+    The pool is process-wide and created on first use, so call this before
+    the first training or batch call. ``1`` disables parallelism; ``None``
+    leaves the default (all cores, or RAYON_NUM_THREADS if set).
+    """
+    if num_threads is None:
+        return
+    if num_threads <= 1:
+        os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    else:
+        os.environ['TOKENIZERS_PARALLELISM'] = 'true'
+        os.environ['RAYON_NUM_THREADS'] = str(num_threads)
+
+
+class HFDecodeStream:
+    """``step``/``flush`` interface over the native incremental decoder.
+
+    The native stream holds the bytes of a split character back (``step``
+    returns None) and emits them once complete.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.stream = decoders.DecodeStream(skip_special_tokens=True)
+
+    def step(self, id):
+        return self.stream.step(self.tokenizer, id) or ''
+
+    def flush(self):
+        return ''
+
+
+@instrumented('hf')
 class CustomHFTokenizer:
-    def __init__(self, vocab_size=25000):
+    def __init__(self, vocab_size=25000, num_threads=None):
+        configure_parallelism(num_threads)
         self.tokenizer = Tokenizer(models.BPE())
         self.tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
         self.trainer = trainers.BpeTrainer(
@@ -12,10 +54,19 @@ class CustomHFTokenizer:
         )
         self.tokenizer.post_processor = processors.ByteLevel(trim_offsets=False)
         self.tokenizer.decoder = decoders.ByteLevel()
+        # Token bytes per ID for decode_stream, and the model they were built from
+        self._decode_table = []
+        self._decode_model = None
+
+    def train(self, corpus_dir, recursive=False, batch_size=1000):
+        """Stream the corpus to the trainer in batches of lines.
 
-    def train(self, corpus_dir):
-        corpus = read_corpus(corpus_dir)
-        self.tokenizer.train_from_iterator([corpus], trainer=self.trainer)
+        Batches let the Rust trainer pre-tokenize in parallel without holding
+        the corpus in memory. No length hint is passed: counting the lines
+        would read the whole corpus a second time.
+        """
+        self.tokenizer.train_from_iterator(iter_corpus_batches(corpus_dir, batch_size, recursive=recursive),
+                                           trainer=self.trainer)
 
     def save(self, path):
         self.tokenizer.save(path)
@@ -26,8 +77,77 @@ class CustomHFTokenizer:
     def encode(self, text):
         return self.tokenizer.encode(text).ids
 
+    def encode_full(self, text):
+        """Tokens, IDs and character offsets from a single encode call."""
+        encoding = self.tokenizer.encode(text)
+        return Encoding(encoding.tokens, encoding.ids, encoding.offsets)
+
+    def encode_batch(self, texts, num_workers=None):
+        """Encode many texts with the native multithreaded batch encoder.
+
+        Returns a flat int32 ID array plus offsets. The Rust thread pool size is
+        process-wide (see ``configure_parallelism``), so ``num_workers`` is
+        accepted for API parity only.
+        """
+        return pack_ids([encoding.ids for encoding in self.tokenizer.encode_batch(list(texts))])
+
+    def chunk(self, text, max_tokens, stride=0):
+        """Windows of at most ``max_tokens`` IDs with their character spans, overlapping by ``stride`` tokens.
+
+        Spans come from the offsets of a single native encode.
+        """
+        encoding = self.tokenizer.encode(text)
+        tokens = ((id, start, end) for id, (start, end) in zip(encoding.ids, encoding.offsets))
+        return window_tokens(tokens, max_tokens, stride)
+
+    def count_tokens(self, text):
+        """Number of tokens, from the length of the native encoding."""
+        return len(self.tokenizer.encode(text))
+
+    def count_tokens_batch(self, texts):
+        """Token count of each text, from one native batch call."""
+        return [len(encoding) for encoding in self.tokenizer.encode_batch(list(texts))]
+
+    def encode_batch_full(self, texts):
+        """Tokens, IDs and offsets of many texts from one native batch call."""
+        return [Encoding(encoding.tokens, encoding.ids, encoding.offsets)
+                for encoding in self.tokenizer.encode_batch(list(texts))]
+
     def decode(self, ids):
         return self.tokenizer.decode(ids)
 
+    def decode_table(self):
+        """Bytes of each token of the byte-level vocabulary, built on first use after the model changes.
+
+        Special tokens are empty, as decode skips them.
+        """
+        if self._decode_model is not self.tokenizer:
+            special = {token['id']: token['special'] for token in json.loads(self.tokenizer.to_str())['added_tokens']}
+            vocab = self.tokenizer.get_vocab(with_added_tokens=True)
+            table = [b''] * (max(vocab.values()) + 1 if vocab else 0)
+            for token, id in vocab.items():
+                if id in special:
+                    table[id] = b'' if special[id] else token.encode('utf-8')
+                else:
+                    table[id] = b''.join(bytes([BYTE_DECODER[c]]) if c in BYTE_DECODER else c.encode('utf-8')
+                                         for c in token)
+            self._decode_table = table
+            self._decode_model = self.tokenizer
+        return self._decode_table
+
+    def decode_stream(self):
+        """Incremental decoder whose ``step(id)`` returns the text each new ID adds.
+
+        Uses the native DecodeStream where the installed tokenizers release
+        has it (0.21 and later), and the byte-level decode table otherwise.
+        """
+        if hasattr(decoders, 'DecodeStream'):
+            return HFDecodeStream(self.tokenizer)
+        return ByteDecodeStream(self.decode_table())
+
+    def decode_batch(self, id_lists):
+        """Decode many ID sequences with the native multithreaded batch decoder."""
+        return self.tokenizer.decode_batch([list(ids) for ids in id_lists])
+
     def tokenize(self, text):
         return self.tokenizer.encode(text).tokens
\ No newline at end of file
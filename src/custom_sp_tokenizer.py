@@ -1,7 +1,11 @@
 import sentencepiece as spm
-from src.utils import read_corpus
+from src.utils import iter_corpus, pack_ids, window_tokens, Encoding
+from src.decode_stream import ByteDecodeStream
+from src.metrics import instrumented
+import io
 import os
 
+@instrumented('sp')
 class CustomSPTokenizer:
     def __init__(self, vocab_size=8000, model_type='unigram', character_coverage=0.9995, max_sentence_length=4192):
         self.vocab_size = vocab_size
@@ -9,16 +13,27 @@ class CustomSPTokenizer:
         self.character_coverage = character_coverage
         self.max_sentence_length = max_sentence_length
         self.sp = None
-        self.model_prefix = 'spm_model'
+        # Surface bytes per ID for decode_stream, and the model they were built from
+        self._decode_table = []
+        self._decode_sp = None
 
-    def train(self, corpus_dir):
-        text = read_corpus(corpus_dir)
-        with open('temp_corpus.txt', 'w', encoding='utf-8') as f:
-            f.write(text)
+    def train(self, corpus_dir, recursive=False, input_sentence_size=0, num_threads=None):
+        """Train on the corpus without writing any files.
+
+        Sentences are streamed from the corpus into the trainer and the model
+        is serialized into memory. ``input_sentence_size`` caps the number of
+        sentences used (a random sample, 0 for all), and ``num_threads``
+        defaults to the number of cores.
+        """
+        sentences = (line.rstrip('\r\n') for line in iter_corpus(corpus_dir, recursive=recursive))
+        model = io.BytesIO()
 
         spm.SentencePieceTrainer.train(
-            input='temp_corpus.txt',
-            model_prefix=self.model_prefix,
+            sentence_iterator=(sentence for sentence in sentences if sentence),
+            model_writer=model,
+            input_sentence_size=input_sentence_size,
+            shuffle_input_sentence=True,
+            num_threads=num_threads or os.cpu_count() or 1,
             vocab_size=self.vocab_size,
             model_type=self.model_type,
             character_coverage=self.character_coverage,
@@ -33,14 +48,12 @@ class CustomSPTokenizer:
             eos_piece='[EOS]'
         )
 
-        self.sp = spm.SentencePieceProcessor()
-        self.sp.load(f'{self.model_prefix}.model')
+        self.sp = spm.SentencePieceProcessor(model_proto=model.getvalue())
 
     def save(self, path):
         if self.sp:
-            # Copy the trained model file to the specified path
-            import shutil
-            shutil.copy(f'{self.model_prefix}.model', path)
+            with open(path, 'wb') as f:
+                f.write(self.sp.serialized_model_proto())
             print(f"Model saved to {path}")
         else:
             print("No model to save. Train the tokenizer first.")
@@ -52,8 +65,66 @@ class CustomSPTokenizer:
     def encode(self, text):
         return self.sp.encode_as_ids(text)
 
+    def encode_full(self, text):
+        """Pieces, IDs and character offsets from a single encode call."""
+        pieces = self.sp.encode_as_immutable_proto(text).pieces
+        return Encoding([p.piece for p in pieces], [p.id for p in pieces], [(p.begin, p.end) for p in pieces])
+
+    def chunk(self, text, max_tokens, stride=0):
+        """Windows of at most ``max_tokens`` IDs with their character spans, overlapping by ``stride`` tokens.
+
+        Spans come from the piece offsets of a single native encode.
+        """
+        pieces = self.sp.encode_as_immutable_proto(text).pieces
+        return window_tokens(((p.id, p.begin, p.end) for p in pieces), max_tokens, stride)
+
+    def encode_batch(self, texts, num_workers=None):
+        """Encode many texts with SentencePiece's native thread pool.
+
+        Returns a flat int32 ID array plus offsets; ``num_workers`` sets the
+        number of threads (default: all cores).
+        """
+        return pack_ids(self.sp.encode(list(texts), out_type=int, num_threads=num_workers or -1))
+
+    def count_tokens(self, text):
+        return len(self.sp.encode_as_ids(text))
+
+    def count_tokens_batch(self, texts, num_workers=None):
+        """Token count of each text, encoded on SentencePiece's native thread pool."""
+        return [len(ids) for ids in self.sp.encode(list(texts), out_type=int, num_threads=num_workers or -1)]
+
     def decode(self, ids):
         return self.sp.decode_ids(ids)
 
+    def decode_table(self):
+        """Surface bytes per ID, built on first use after the model changes.
+
+        ``▁`` becomes a space, control pieces are empty, unknown pieces read
+        `` ⁇ `` like decode_ids, and byte pieces are their byte.
+        """
+        if self._decode_sp is not self.sp:
+            table = []
+            for id in range(self.sp.get_piece_size()):
+                piece = self.sp.id_to_piece(id)
+                if self.sp.is_control(id):
+                    table.append(b'')
+                elif self.sp.is_unknown(id):
+                    table.append(' \u2047 '.encode('utf-8'))
+                elif self.sp.is_byte(id):
+                    table.append(bytes([int(piece[1:-1], 16)]))
+                else:
+                    table.append(piece.replace('\u2581', ' ').encode('utf-8'))
+            self._decode_table = table
+            self._decode_sp = self.sp
+        return self._decode_table
+
+    def decode_stream(self):
+        """Incremental decoder whose ``step(id)`` returns the text each new ID adds.
+
+        Byte pieces are held until their character is complete, and the
+        leading space of the dummy prefix is dropped.
+        """
+        return ByteDecodeStream(self.decode_table(), strip_first_space=True)
+
     def tokenize(self, text):
         return self.sp.encode_as_pieces(text)
\ No newline at end of file
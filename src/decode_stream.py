@@ -0,0 +1,82 @@
+import codecs
+from typing import List, Sequence
+
+
+def decode_table(inverse_vocab, default: str = '<unk>') -> List[str]:
+    """ID -> token list covering every ID up to the highest, ``default`` for gaps."""
+    if not inverse_vocab:
+        return []
+    size = max(inverse_vocab) + 1
+    return [inverse_vocab.get(id, default) for id in range(size)]
+
+
+class TextDecodeStream:
+    """Incremental decoder over a table of token strings.
+
+    ``step(id)`` returns the text that ID adds to the output, so a generated
+    stream is decoded in constant time per token instead of re-decoding the
+    prefix. ``separator`` goes between tokens. With ``strip`` the output
+    matches a ``str.strip()`` of the whole text: leading whitespace is
+    dropped and trailing whitespace is held back until more text follows.
+    ``flush()`` returns whatever is still held back, which is nothing unless
+    ``strip`` is false.
+    """
+
+    def __init__(self, table: Sequence[str], separator: str = '', strip: bool = False, unknown: str = '<unk>'):
+        self.table = table
+        self.separator = separator
+        self.strip = strip
+        self.unknown = unknown
+        self.started = False
+        self.pending = ''
+
+    def step(self, id: int) -> str:
+        piece = self.table[id] if 0 <= id < len(self.table) else self.unknown
+        if self.separator and self.started:
+            piece = self.separator + piece
+        if not self.strip:
+            self.started = True
+            return piece
+        if not self.started:
+            piece = piece.lstrip()
+            if not piece:
+                return ''
+            self.started = True
+        text = self.pending + piece
+        delta = text.rstrip()
+        self.pending = text[len(delta):]
+        return delta
+
+    def flush(self) -> str:
+        return ''
+
+
+class ByteDecodeStream:
+    """Incremental decoder over a table of token bytes.
+
+    A token may end in the middle of a multi-byte UTF-8 character; those
+    bytes are kept by an incremental UTF-8 decoder until the character is
+    complete, and invalid bytes become U+FFFD like ``bytes.decode(errors='replace')``.
+    With ``strip_first_space`` one leading space of the output is dropped,
+    as SentencePiece does with its dummy prefix.
+    """
+
+    def __init__(self, table: Sequence[bytes], strip_first_space: bool = False):
+        self.table = table
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.strip_first_space = strip_first_space
+
+    def _emit(self, text: str) -> str:
+        if self.strip_first_space and text:
+            self.strip_first_space = False
+            if text[0] == ' ':
+                return text[1:]
+        return text
+
+    def step(self, id: int) -> str:
+        data = self.table[id] if 0 <= id < len(self.table) else b''
+        return self._emit(self.decoder.decode(data))
+
+    def flush(self) -> str:
+        return self._emit(self.decoder.decode(b'', final=True))
+
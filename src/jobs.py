@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+from src.registry import TokenizerRegistry, TokenizerSpec
+from src.utils import iter_corpus, corpus_files
+from src.metrics import METRICS
+
+STATUS_FILE = "status.json"
+
+
+def _report(status_file: str, **fields) -> None:
+    """Write a job's progress where the serving process can poll it."""
+    with open(status_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(fields, f)
+    os.replace(status_file + ".tmp", status_file)
+
+
+def read_status(status_file: str) -> Dict:
+    try:
+        with open(status_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def train_artifact(spec: TokenizerSpec, corpus_dir: str, artifact: str, status_file: str) -> str:
+    """Train a fresh tokenizer described by ``spec`` on ``corpus_dir`` and save it to ``artifact``.
+
+    Runs in the training process. The model is saved under a temporary name
+    and renamed, so a half-written artifact is never visible.
+    """
+    started = time.time()
+    _report(status_file, stage="loading", progress=0.0, started_at=started)
+    tokenizer_class = getattr(importlib.import_module(spec.module), spec.class_name)
+    tokenizer = tokenizer_class(**spec.kwargs)
+
+    _report(status_file, stage="training", progress=0.1, started_at=started)
+    if hasattr(tokenizer, "fit"):
+        tokenizer.fit(iter_corpus(corpus_dir))
+    else:
+        tokenizer.train(corpus_dir)
+
+    _report(status_file, stage="saving", progress=0.9, started_at=started)
+    os.makedirs(os.path.dirname(artifact), exist_ok=True)
+    root, ext = os.path.splitext(artifact)
+    tmp_path = f"{root}.tmp{ext}"
+    tokenizer.save(tmp_path)
+    os.replace(tmp_path, artifact)
+    _report(status_file, stage="done", progress=1.0, started_at=started)
+    return artifact
+
+
+class TrainingJobs:
+    """Queue of training jobs that run in a separate process and hot-swap their result.
+
+    Training never touches the tokenizers being served: each job trains a new
+    model in a worker process and writes it to a versioned artifact,
+    ``<artifact_dir>/<name>/<version><ext>``. When the job succeeds the new
+    model is loaded and swapped into the registry in one step, so requests
+    that already hold the old tokenizer finish with it. Jobs run one at a time
+    in submission order.
+    """
+
+    def __init__(self, registry: TokenizerRegistry, artifact_dir: str = "trained_vocabs/versions"):
+        self.registry = registry
+        self.artifact_dir = artifact_dir
+        self.jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.executor = self._new_executor()
+
+    @staticmethod
+    def _new_executor() -> ProcessPoolExecutor:
+        # spawn: forking a threaded server process can deadlock the child
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swap in a new pool after a worker died (e.g. killed for memory); a broken pool never recovers."""
+        with self._lock:
+            if self.executor is broken:
+                logging.warning("Training worker died; starting a new training process pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+            return self.executor
+
+    def create_job_dir(self) -> str:
+        """A scratch directory for a job's uploaded corpus; removed when the job finishes."""
+        return tempfile.mkdtemp(prefix="train_job_")
+
+    def submit(self, name: str, corpus_dir: str, job_dir: Optional[str] = None) -> str:
+        """Queue training of tokenizer ``name`` on ``corpus_dir`` and return the job ID."""
+        if name not in self.registry:
+            raise KeyError(f"Unknown tokenizer: {name}")
+        spec = self.registry.specs[name]
+        job_id = uuid.uuid4().hex[:12]
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{job_id}"
+        ext = os.path.splitext(spec.vocab_file or "")[1] or ".txt"
+        artifact = os.path.join(self.artifact_dir, name, version + ext)
+        job_dir = job_dir or self.create_job_dir()
+        status_file = os.path.join(job_dir, STATUS_FILE)
+        job = {"id": job_id, "tokenizer": name, "version": version, "artifact": artifact,
+               "status": "queued", "stage": "queued", "progress": 0.0, "error": None,
+               "submitted_at": time.time(), "started_at": None, "finished_at": None,
+               "job_dir": job_dir, "status_file": status_file,
+               "corpus_bytes": sum(os.path.getsize(path) for path in corpus_files(corpus_dir))}
+        with self._lock:
+            self.jobs[job_id] = job
+        job["args"] = (spec, corpus_dir, artifact, status_file)
+        self._run(job)
+        logging.info(f"Queued training job {job_id} for {name} tokenizer")
+        return job_id
+
+    def _run(self, job: Dict) -> None:
+        executor = self.executor
+        try:
+            future = executor.submit(train_artifact, *job["args"])
+        except BrokenProcessPool:
+            executor = self._replace_executor(executor)
+            future = executor.submit(train_artifact, *job["args"])
+        job["executor"] = executor
+        future.add_done_callback(lambda f: self._finish(job["id"], f))
+
+    def _finish(self, job_id: str, future) -> None:
+        job = self.jobs[job_id]
+        progress = read_status(job["status_file"])
+        if isinstance(future.exception(), BrokenProcessPool) and not progress and not job.get("retried"):
+            # Queued behind a worker that died and never started: run it on a new pool
+            self._replace_executor(job["executor"])
+            job["retried"] = True
+            self._run(job)
+            return
+        started = progress.get("started_at") or job["submitted_at"]
+        try:
+            artifact = future.result()
+            self.registry.swap(job["tokenizer"], artifact, job["version"])
+            job.update(status="succeeded", stage="done", progress=1.0)
+            logging.info(f"Training job {job_id} finished; {job['tokenizer']} is now version {job['version']}")
+        except BrokenProcessPool:
+            job.update(status="failed", stage=progress.get("stage", job["stage"]),
+                       error="The training process died, possibly out of memory")
+            logging.error(f"Training job {job_id} for {job['tokenizer']} tokenizer failed: its process died")
+            self._replace_executor(job["executor"])
+        except Exception as e:
+            job.update(status="failed", stage=progress.get("stage", job["stage"]), error=str(e))
+            logging.error(f"Training job {job_id} for {job['tokenizer']} tokenizer failed: {e}")
+        finally:
+            job.pop("executor", None)
+            job.pop("args", None)
+            job.update(started_at=progress.get("started_at"), finished_at=time.time())
+            # Training runs in another process, so its metrics are recorded here
+            METRICS.observe(job["tokenizer"], "train", job["finished_at"] - started,
+                            input_bytes=job["corpus_bytes"], error=job["status"] == "failed")
+            shutil.rmtree(job["job_dir"], ignore_errors=True)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Public view of a job, with live progress while it is queued or running."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        view = {k: v for k, v in job.items() if k not in ("job_dir", "status_file", "executor", "args", "retried")}
+        if view["status"] == "queued":
+            progress = read_status(job["status_file"])
+            if progress:
+                view.update(progress, status="running")
+        return view
+
+    def list(self) -> List[Dict]:
+        return sorted((self.status(job_id) for job_id in list(self.jobs)), key=lambda j: j["submitted_at"])
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,239 @@
+import os
+import time
+import threading
+import functools
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Tuple
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Methods recorded by @instrumented, and the operation each one is reported as
+INSTRUMENTED_METHODS = {
+    'tokenize': 'tokenize',
+    'encode': 'encode',
+    'encode_full': 'encode',
+    'encode_batch': 'encode_batch',
+    'encode_batch_full': 'encode_batch',
+    'decode': 'decode',
+    'decode_batch': 'decode_batch',
+    'count_tokens': 'count',
+    'count_tokens_batch': 'count_batch',
+    'train': 'train',
+    'train_from_word_counts': 'train',
+    'fit': 'train',
+}
+
+
+class _Series:
+    __slots__ = ('buckets', 'count', 'seconds', 'tokens', 'input_bytes', 'errors')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.tokens = 0
+        self.input_bytes = 0
+        self.errors = 0
+
+
+class Metrics:
+    """Latency histograms and token/byte counters per (tokenizer, operation).
+
+    ``observe`` is a handful of additions under a lock, cheap enough to run on
+    every call. ``render`` produces the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, tokenizer: str, operation: str, seconds: float,
+                tokens: int = 0, input_bytes: int = 0, error: bool = False) -> None:
+        with self._lock:
+            series = self.series.get((tokenizer, operation))
+            if series is None:
+                series = self.series[(tokenizer, operation)] = _Series()
+            series.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            series.count += 1
+            series.seconds += seconds
+            series.tokens += tokens
+            series.input_bytes += input_bytes
+            series.errors += error
+
+    def reset(self) -> None:
+        with self._lock:
+            self.series.clear()
+
+    def render(self, caches: Iterable[Tuple[str, str, Dict[str, int]]] = ()) -> str:
+        """Prometheus text format. ``caches`` adds (tokenizer, cache, info) hit/miss counters."""
+        with self._lock:
+            snapshot = sorted((key, _copy(series)) for key, series in self.series.items())
+        lines = [
+            '# HELP tokenizer_latency_seconds Time spent in a tokenizer operation.',
+            '# TYPE tokenizer_latency_seconds histogram',
+        ]
+        for (name, op), s in snapshot:
+            labels = f'tokenizer="{name}",operation="{op}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                cumulative += count
+                lines.append(f'tokenizer_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'tokenizer_latency_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+            lines.append(f'tokenizer_latency_seconds_sum{{{labels}}} {s.seconds:.6f}')
+            lines.append(f'tokenizer_latency_seconds_count{{{labels}}} {s.count}')
+        for metric, kind, help_text, value in (
+            ('tokenizer_tokens_total', 'counter', 'Tokens produced or consumed.', lambda s: s.tokens),
+            ('tokenizer_input_bytes_total', 'counter', 'UTF-8 bytes of input text.', lambda s: s.input_bytes),
+            ('tokenizer_errors_total', 'counter', 'Calls that raised an exception.', lambda s: s.errors),
+            ('tokenizer_tokens_per_second', 'gauge', 'Average tokens per second of busy time.',
+             lambda s: s.tokens / s.seconds if s.seconds > 0 else 0.0),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for (name, op), s in snapshot:
+                lines.append(f'{metric}{{tokenizer="{name}",operation="{op}"}} {value(s):g}')
+        caches = list(caches)
+        if caches:
+            for metric, field in (('tokenizer_cache_hits_total', 'hits'), ('tokenizer_cache_misses_total', 'misses')):
+                lines.append(f'# TYPE {metric} counter')
+                for name, cache, info in caches:
+                    lines.append(f'{metric}{{tokenizer="{name}",cache="{cache}"}} {info.get(field, 0)}')
+            lines.append('# TYPE tokenizer_cache_hit_ratio gauge')
+            for name, cache, info in caches:
+                lookups = info.get('hits', 0) + info.get('misses', 0)
+                ratio = info.get('hits', 0) / lookups if lookups else 0.0
+                lines.append(f'tokenizer_cache_hit_ratio{{tokenizer="{name}",cache="{cache}"}} {ratio:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(series: _Series) -> _Series:
+    copy = _Series()
+    copy.buckets = list(series.buckets)
+    for field in ('count', 'seconds', 'tokens', 'input_bytes', 'errors'):
+        setattr(copy, field, getattr(series, field))
+    return copy
+
+
+METRICS = Metrics()
+
+_local = threading.local()
+
+
+def text_bytes(value) -> int:
+    """UTF-8 size of a text or list of texts; 0 for anything else (e.g. a corpus directory)."""
+    if isinstance(value, str):
+        return len(value) if value.isascii() else len(value.encode('utf-8', 'surrogatepass'))
+    if isinstance(value, (list, tuple)):
+        return sum(text_bytes(v) for v in value if isinstance(v, str))
+    return 0
+
+
+def _count_tokens(operation: str, args: tuple, result) -> int:
+    if operation == 'decode':
+        return len(args[0]) if args else 0
+    if operation == 'decode_batch':
+        return sum(len(ids) for ids in args[0]) if args else 0
+    if operation == 'encode_batch':
+        if isinstance(result, list):
+            return sum(len(encoding.ids) for encoding in result)
+        return int(result[0].size)
+    if operation == 'train':
+        return 0
+    if operation == 'count':
+        return result
+    if operation == 'count_batch':
+        return sum(result)
+    if isinstance(result, tuple) and len(result) == 3:
+        # encode_full's (tokens, ids, offsets)
+        return len(result[1])
+    return len(result)
+
+
+def _wrap(method, name: str, operation: str):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Only the outermost instrumented call is recorded, so encode calling
+        # tokenize (or train calling train_from_word_counts) is counted once
+        if getattr(_local, 'active', False):
+            return method(self, *args, **kwargs)
+        _local.active = True
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception:
+            METRICS.observe(name, operation, time.perf_counter() - start, error=True)
+            raise
+        finally:
+            _local.active = False
+        elapsed = time.perf_counter() - start
+        METRICS.observe(name, operation, elapsed, _count_tokens(operation, args, result),
+                        text_bytes(args[0]) if args and not operation.startswith('decode') else 0)
+        return result
+    return wrapper
+
+
+def instrumented(name: str):
+    """Class decorator recording latency, tokens and input bytes of a tokenizer's public methods under ``name``."""
+    def decorate(cls):
+        for method_name, operation in INSTRUMENTED_METHODS.items():
+            method = cls.__dict__.get(method_name)
+            if method is not None:
+                setattr(cls, method_name, _wrap(method, name, operation))
+        return cls
+    return decorate
+
+
+class SlowRequestProfiler:
+    """Samples requests under cProfile and keeps the profiles of slow ones.
+
+    Enabled by ``PROFILE_SLOW_MS``: a sampled request taking at least that many
+    milliseconds has its stats dumped to ``PROFILE_DIR`` (default
+    ``profiles``). ``PROFILE_SAMPLE_RATE`` (default 0.01) is the fraction of
+    requests profiled, as profiling slows the request down.
+    """
+
+    def __init__(self, threshold_ms: Optional[float] = None, sample_rate: float = 0.01, output_dir: str = 'profiles'):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._count = 0
+
+    @classmethod
+    def from_env(cls) -> 'SlowRequestProfiler':
+        threshold = os.environ.get('PROFILE_SLOW_MS')
+        return cls(float(threshold) if threshold else None,
+                   float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01)),
+                   os.environ.get('PROFILE_DIR', 'profiles'))
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms is not None and self.sample_rate > 0
+
+    def start(self):
+        """Return a running profiler if this request is sampled, otherwise None."""
+        if not self.enabled:
+            return None
+        # Deterministic sampling: every (1 / sample_rate)-th request
+        self._count += 1
+        if self._count * self.sample_rate < 1:
+            return None
+        self._count = 0
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active
+            return None
+        return profiler
+
+    def stop(self, profiler, elapsed: float, label: str) -> Optional[str]:
+        """Stop ``profiler``; if the request was slow, save its stats and return the file path."""
+        profiler.disable()
+        if elapsed * 1000 < self.threshold_ms:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{int(elapsed * 1000)}ms.prof")
+        profiler.dump_stats(path)
+        return path
@@ -1,7 +1,12 @@
 import regex
-from typing import List, Dict
-from src.utils import save_vocab, load_vocab
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, TextIO, Tuple, Union
+import numpy as np
+from src.utils import encode_batch_in_processes, count_token_frequencies, build_vocab, extend_vocab, window_tokens, Encoding, Chunk
+from src.vocab_store import VocabStore, as_vocab_store
+from src.decode_stream import TextDecodeStream, decode_table
+from src.metrics import instrumented
 
+@instrumented('regex')
 class RegexTokenizer:
     PATTERNS: Dict[str, str] = {
         'basic': r'\b\w+\b|\S',
@@ -9,6 +14,9 @@ class RegexTokenizer:
         'gpt4': r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+""",
         'improved': r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}+(?:[.,]\p{N}+)?| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
     }
+    SPECIAL_TOKENS: List[str] = ['<unk>']
+    # Characters kept before the scan position when streaming, for lookbehind context
+    STREAM_CONTEXT = 8
 
     def __init__(self, pattern: str = 'basic'):
         if pattern in self.PATTERNS:
@@ -17,15 +25,54 @@ class RegexTokenizer:
             self.pattern = regex.compile(pattern)
         self.vocab = {}
         self.inverse_vocab = {}
+        # ID -> token list for decode, and the vocabulary it was built from
+        self._decode_table = []
+        self._decode_vocab = None
 
-    def fit(self, text: str):
-        """Build vocabulary from the given text."""
-        tokens = self.tokenize(text)
-        # Create a set of unique tokens, preserving leading spaces
-        unique_tokens = set(tokens)
-        # Create vocabulary, assigning each unique token an index
-        self.vocab = {token: i for i, token in enumerate(unique_tokens)}
-        self.inverse_vocab = {i: token for token, i in self.vocab.items()}
+    def fit(self, text: Union[str, Iterable[str]], max_vocab_size: Optional[int] = None,
+            min_freq: int = 1, num_workers: Optional[int] = None):
+        """Build vocabulary from the given text, or from an iterable of text pieces such as utils.iter_corpus.
+
+        The pieces are read as one continuous text, so tokens spanning two lines
+        are counted as encode() sees them. Tokens are counted in parallel
+        chunks. IDs start with SPECIAL_TOKENS and then follow descending
+        frequency, so refitting on the same data gives the same IDs.
+        ``min_freq`` and ``max_vocab_size`` cap the vocabulary.
+        """
+        pieces = [text] if isinstance(text, str) else text
+        # Tokens are counted as they appear, leading spaces included, by a vocab-less
+        # copy; this instance keeps its vocabulary for threads still encoding, and if counting fails
+        counts = count_token_frequencies(RegexTokenizer(self.pattern.pattern), pieces, num_workers=num_workers)
+        vocab = VocabStore.from_dict(build_vocab(counts, self.SPECIAL_TOKENS, max_vocab_size, min_freq))
+        self.vocab, self.inverse_vocab = vocab, vocab.inverse
+
+    def update(self, text: Union[str, Iterable[str]], max_new_tokens: Optional[int] = None,
+               min_freq: int = 1, num_workers: Optional[int] = None) -> int:
+        """Add the unseen tokens of new text to the vocabulary without renumbering existing ones.
+
+        New tokens get IDs after the current highest ID, by descending
+        frequency, so data encoded with the old vocabulary stays valid. A
+        vocabulary without an ``<unk>`` entry first gets one at its implicit
+        unknown ID, len(vocab). Returns the number of tokens added.
+        """
+        pieces = [text] if isinstance(text, str) else text
+        vocab = dict(self.vocab.items())
+        if '<unk>' not in vocab:
+            vocab['<unk>'] = self.unk_id
+        # Counting only tokenizes; a vocab-less instance is cheap to send to workers
+        # and leaves this one untouched for threads still encoding with it
+        counts = count_token_frequencies(RegexTokenizer(self.pattern.pattern), pieces, num_workers=num_workers)
+        added = extend_vocab(vocab, counts, max_new_tokens, min_freq)
+        if added or len(vocab) != len(self.vocab):
+            vocab.update(added)
+            self.vocab = VocabStore.from_dict(vocab)
+            self.inverse_vocab = self.vocab.inverse
+        return len(added)
+
+    @property
+    def unk_id(self) -> int:
+        """ID of unknown tokens; vocabularies saved before SPECIAL_TOKENS existed use len(vocab)."""
+        return self.vocab.get('<unk>', len(self.vocab))
 
     def tokenize(self, text: str) -> List[str]:
         """Tokenize the input text using the specified regex pattern."""
@@ -34,25 +81,124 @@ class RegexTokenizer:
     def encode(self, text: str) -> List[int]:
         """Encode the input text into token IDs."""
         tokens = self.tokenize(text)
-        return [self.vocab.get(token, len(self.vocab)) for token in tokens]
+        unk_id = self.unk_id
+        return [self.vocab.get(token, unk_id) for token in tokens]
+
+    def encode_full(self, text: str) -> Encoding:
+        """Tokens, IDs and character offsets from a single pass over the text."""
+        unk_id = self.unk_id
+        tokens, ids, offsets = [], [], []
+        for match in self.pattern.finditer(text):
+            token = match.group()
+            tokens.append(token)
+            ids.append(self.vocab.get(token, unk_id))
+            offsets.append(match.span())
+        return Encoding(tokens, ids, offsets)
+
+    def _iter_matches(self, source: Union[str, TextIO, Iterable[str]],
+                      chunk_size: int = 1 << 16) -> Iterator[Tuple[str, int, int]]:
+        """Yield (token, start, end) for a text, a text stream or an iterable of chunks.
+
+        Matches are taken from a sliding buffer with finditer. A match is only
+        emitted once at least one more match follows it and it ends before the
+        buffer does, so neither more input nor a lookahead could change it; the
+        last match of each buffer is re-scanned together with the next chunk.
+        A few characters before the scan position are kept so lookbehinds such
+        as ``\\b`` see the same context as in a whole-text run.
+        """
+        if isinstance(source, str):
+            chunks = (source[i:i + chunk_size] for i in range(0, len(source), chunk_size))
+        elif hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(chunk_size), '')
+        else:
+            chunks = source
+
+        buffer = ''
+        base = 0  # stream offset of buffer[0]
+        pos = 0   # scan position within buffer
+        for chunk in chunks:
+            keep = max(0, pos - self.STREAM_CONTEXT)
+            buffer = buffer[keep:] + chunk
+            base += keep
+            pos -= keep
+            pending = None
+            for match in self.pattern.finditer(buffer, pos):
+                if match.end() >= len(buffer):
+                    break
+                if pending is not None:
+                    yield pending.group(), base + pending.start(), base + pending.end()
+                    pos = pending.end()
+                pending = match
+        for match in self.pattern.finditer(buffer, pos):
+            yield match.group(), base + match.start(), base + match.end()
+
+    def tokenize_iter(self, source: Union[str, TextIO, Iterable[str]], chunk_size: int = 1 << 16) -> Iterator[str]:
+        """Lazily tokenize a text or text stream read in chunks; yields the same tokens as tokenize()."""
+        for token, _, _ in self._iter_matches(source, chunk_size):
+            yield token
+
+    def encode_iter(self, source: Union[str, TextIO, Iterable[str]], chunk_size: int = 1 << 16) -> Iterator[int]:
+        """Lazily encode a text or text stream read in chunks; yields the same IDs as encode()."""
+        unk_id = self.unk_id
+        for token, _, _ in self._iter_matches(source, chunk_size):
+            yield self.vocab.get(token, unk_id)
+
+    def chunk(self, source: Union[str, TextIO, Iterable[str]], max_tokens: int, stride: int = 0,
+              chunk_size: int = 1 << 16) -> Iterator[Chunk]:
+        """Windows of at most ``max_tokens`` IDs with their character spans, overlapping by ``stride`` tokens.
+
+        Like encode_iter, ``source`` may be a text stream or an iterable of
+        text pieces; spans are offsets into the concatenated stream.
+        """
+        unk_id = self.unk_id
+        tokens = ((self.vocab.get(token, unk_id), start, end)
+                  for token, start, end in self._iter_matches(source, chunk_size))
+        return window_tokens(tokens, max_tokens, stride)
+
+    def encode_batch(self, texts: List[str], num_workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode many texts on a process pool into a flat int32 ID array plus offsets."""
+        return encode_batch_in_processes(self, texts, num_workers)
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens encode() would return, counted from the pattern matches."""
+        return sum(1 for _ in self.pattern.finditer(text))
+
+    def count_tokens_batch(self, texts: Iterable[str]) -> List[int]:
+        """Token count of each text."""
+        return [self.count_tokens(text) for text in texts]
+
+    def decode_table(self) -> Sequence[str]:
+        """ID -> token table: a view of a VocabStore, or a list built once per dict vocabulary."""
+        if isinstance(self.vocab, VocabStore):
+            return self.vocab.token_table()
+        if self._decode_vocab is not self.vocab:
+            self._decode_table = decode_table(self.inverse_vocab)
+            self._decode_vocab = self.vocab
+        return self._decode_table
 
     def decode(self, token_ids: List[int]) -> str:
         """Decode the token IDs back into text."""
-        tokens = [self.inverse_vocab.get(id, '<unk>') for id in token_ids]
-        return self.detokenize(tokens)
+        if isinstance(self.vocab, VocabStore):
+            # Straight from the mapped string blob; no per-token strings are kept
+            return self.vocab.join(token_ids, '')
+        table = self.decode_table()
+        size = len(table)
+        return ''.join([table[id] if 0 <= id < size else '<unk>' for id in token_ids])
+
+    def decode_stream(self) -> TextDecodeStream:
+        """Incremental decoder whose ``step(id)`` returns the text each new ID adds."""
+        return TextDecodeStream(self.decode_table())
 
     def detokenize(self, tokens: List[str]) -> str:
         """Detokenize the input tokens by joining them."""
         return "".join(tokens)
 
     def save(self, vocab_file):
-        # Ensure we're saving the tokens exactly as they are, including spaces
-        vocab_to_save = {repr(k): v for k, v in self.vocab.items()}
-        save_vocab(vocab_to_save, vocab_file)
+        """Save the vocabulary in the binary VocabStore format."""
+        as_vocab_store(self.vocab).save(vocab_file)
         print(f"\nVocabulary saved to {vocab_file}")
 
     def load(self, vocab_file):
-        loaded_vocab = load_vocab(vocab_file)
-        # Convert the loaded vocabulary back to the original format
-        self.vocab = {eval(k): int(v) for k, v in loaded_vocab.items()}
-        self.inverse_vocab = {int(v): eval(k) for k, v in loaded_vocab.items()}
\ No newline at end of file
+        """Map a binary vocabulary file, or read a legacy text one."""
+        self.vocab = VocabStore.load(vocab_file)
+        self.inverse_vocab = self.vocab.inverse
\ No newline at end of file
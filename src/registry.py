@@ -0,0 +1,149 @@
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+
+class TokenizerSpec(NamedTuple):
+    """Where a tokenizer class lives, how to construct it and which vocabulary to load."""
+    module: str
+    class_name: str
+    vocab_file: Optional[str] = None
+    kwargs: Dict[str, Any] = {}
+
+
+DEFAULT_SPECS: Dict[str, TokenizerSpec] = {
+    'whitespace': TokenizerSpec('src.whitespace_tokenizer', 'WhitespaceTokenizer', 'trained_vocabs/whitespace_vocab.bin'),
+    'regex': TokenizerSpec('src.regex_tokenizer', 'RegexTokenizer', 'trained_vocabs/regex_vocab_gpt2.bin', {'pattern': 'gpt2'}),
+    'bpe': TokenizerSpec('src.bpe_tokenizer', 'BPETokenizer', 'trained_vocabs/bpe_vocab.bin'),
+    'hf': TokenizerSpec('src.custom_hf_tokenizer', 'CustomHFTokenizer', 'trained_vocabs/hf_vocab.json'),
+    'sp': TokenizerSpec('src.custom_sp_tokenizer', 'CustomSPTokenizer', 'trained_vocabs/sp_vocab.model'),
+}
+
+LATEST_FILE = 'LATEST'
+
+
+class TokenizerRegistry:
+    """Imports tokenizer backends and loads their vocabularies on first use.
+
+    An instance that only serves ``regex`` never imports the Hugging Face or
+    SentencePiece libraries. Names in ``warmup`` are loaded right away, and
+    every load is logged with its import and load time.
+
+    Retrained models live under ``artifact_dir`` as ``<name>/<version><ext>``
+    with a ``LATEST`` file naming the current version, which takes precedence
+    over the spec's vocabulary file on the next start.
+    """
+
+    def __init__(self, specs: Optional[Dict[str, TokenizerSpec]] = None, warmup: Iterable[str] = (),
+                 artifact_dir: Optional[str] = "trained_vocabs/versions"):
+        self.specs = dict(DEFAULT_SPECS if specs is None else specs)
+        self.artifact_dir = artifact_dir
+        self.tokenizers: Dict[str, Any] = {}
+        self.versions: Dict[str, str] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        # Called with the tokenizer name after swap() replaces its model
+        self.swap_listeners: List[Callable[[str], None]] = []
+        self._locks = {name: threading.Lock() for name in self.specs}
+        for name in self.specs:
+            self._use_latest_artifact(name)
+        self.warm_up(warmup)
+
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.specs
+
+    def __getitem__(self, name: str):
+        return self.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.tokenizers
+
+    def get(self, name: str):
+        """Return the tokenizer called ``name``, importing and loading it if needed."""
+        tokenizer = self.tokenizers.get(name)
+        if tokenizer is not None:
+            return tokenizer
+        if name not in self.specs:
+            raise KeyError(f"Unknown tokenizer: {name}")
+        with self._locks[name]:
+            if name not in self.tokenizers:
+                self.tokenizers[name] = self._load(name)
+        return self.tokenizers[name]
+
+    def version(self, name: str) -> str:
+        """Version of the model currently served as ``name``; 'base' for the shipped vocabulary."""
+        return self.versions.get(name, 'base')
+
+    def get_with_version(self, name: str):
+        """Return (tokenizer, version) for ``name``.
+
+        swap() stores the tokenizer before the version, so reading them in the
+        opposite order never pairs the new version with the old tokenizer.
+        """
+        version = self.version(name)
+        return self.get(name), version
+
+    def swap(self, name: str, vocab_file: str, version: str):
+        """Load a new model for ``name`` from ``vocab_file`` and start serving it.
+
+        The model is loaded before the swap, and replacing the dictionary entry
+        is atomic, so every request sees either the old tokenizer or the new
+        one. Requests that already hold the old tokenizer keep using it.
+        """
+        with self._locks[name]:
+            previous = self.specs[name]
+            self.specs[name] = previous._replace(vocab_file=vocab_file)
+            try:
+                tokenizer = self._load(name)
+            except Exception:
+                self.specs[name] = previous
+                raise
+            self.tokenizers[name] = tokenizer
+            self.versions[name] = version
+            if self.artifact_dir:
+                latest = os.path.join(self.artifact_dir, name, LATEST_FILE)
+                with open(latest + '.tmp', 'w', encoding='utf-8') as f:
+                    f.write(os.path.basename(vocab_file))
+                os.replace(latest + '.tmp', latest)
+        for listener in self.swap_listeners:
+            listener(name)
+        return tokenizer
+
+    def _use_latest_artifact(self, name: str) -> None:
+        if not self.artifact_dir:
+            return
+        latest = os.path.join(self.artifact_dir, name, LATEST_FILE)
+        if not os.path.exists(latest):
+            return
+        with open(latest, 'r', encoding='utf-8') as f:
+            filename = f.read().strip()
+        vocab_file = os.path.join(self.artifact_dir, name, filename)
+        if os.path.exists(vocab_file):
+            self.specs[name] = self.specs[name]._replace(vocab_file=vocab_file)
+            self.versions[name] = os.path.splitext(filename)[0]
+
+    def warm_up(self, names: Iterable[str]) -> None:
+        for name in names:
+            if name:
+                self.get(name)
+
+    def _load(self, name: str):
+        spec = self.specs[name]
+        start = time.perf_counter()
+        tokenizer_class = getattr(importlib.import_module(spec.module), spec.class_name)
+        imported = time.perf_counter()
+        tokenizer = tokenizer_class(**spec.kwargs)
+        if spec.vocab_file and os.path.exists(spec.vocab_file):
+            tokenizer.load(spec.vocab_file)
+        elif spec.vocab_file:
+            logging.warning(f"Vocabulary file {spec.vocab_file} not found for {name} tokenizer")
+        loaded = time.perf_counter()
+        self.timings[name] = {'import_s': imported - start, 'load_s': loaded - imported}
+        logging.info(f"Loaded {name} tokenizer in {loaded - start:.3f}s "
+                     f"(import {imported - start:.3f}s, load {loaded - imported:.3f}s)")
+        return tokenizer
@@ -0,0 +1,95 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def text_key(name: str, version: str, text: str) -> Tuple[str, str, bytes]:
+    """Cache key for ``text`` tokenized by model ``version`` of tokenizer ``name``."""
+    return name, version, hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache of JSON-serializable results, bounded by entry count and total bytes.
+
+    An entry's size is the length of its JSON encoding, which is what it costs
+    to send back. Keys start with the tokenizer name, so ``invalidate`` can
+    drop every entry of a tokenizer whose model was replaced.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, max_entries: int = 10000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.data: OrderedDict = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # name -> [hits, misses], for per-tokenizer hit rates
+        self.by_name: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self.data.get(key)
+            counts = self.by_name.setdefault(key[0], [0, 0])
+            if entry is None:
+                self.misses += 1
+                counts[1] += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            counts[0] += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = len(json.dumps(value))
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self.data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.data[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes or len(self.data) > self.max_entries:
+                _, (_, evicted) = self.data.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def name_info(self) -> Dict[str, Dict[str, int]]:
+        """Hits and misses per tokenizer name."""
+        with self._lock:
+            return {name: {'hits': hits, 'misses': misses} for name, (hits, misses) in self.by_name.items()}
+
+    def invalidate(self, name: str) -> int:
+        """Drop every entry of tokenizer ``name``; returns how many were dropped."""
+        with self._lock:
+            stale = [key for key in self.data if key[0] == name]
+            for key in stale:
+                self.bytes -= self.data.pop(key)[1]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self.data),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries
+            }
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from tqdm import tqdm
+from src.utils import corpus_files, split_text
+
+MANIFEST_FILE = "manifest.json"
+
+_worker_tokenizer = None
+
+
+def vocab_bound(tokenizer) -> int:
+    """Upper bound (exclusive) on the token IDs a tokenizer can emit."""
+    if hasattr(tokenizer, 'sp'):
+        return tokenizer.sp.get_piece_size()
+    if hasattr(tokenizer, 'tokenizer'):
+        return tokenizer.tokenizer.get_vocab_size()
+    # Whitespace and regex tokenizers encode unknown tokens as len(vocab)
+    return max(len(tokenizer.vocab), max(tokenizer.inverse_vocab, default=0)) + 1
+
+
+def _init_shard_worker(tokenizer_class, vocab_file: str) -> None:
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer_class()
+    _worker_tokenizer.load(vocab_file)
+
+
+def encode_file_to_shard(tokenizer, source: str, shard_path: str, dtype: str,
+                         lines_as_documents: bool = False, batch_lines: int = 1024,
+                         chunk_chars: int = 1 << 16) -> Tuple[int, int]:
+    """Encode one text file into ``<shard_path>.bin`` (token IDs) and ``.idx`` (int64 document offsets).
+
+    Each file is one document unless ``lines_as_documents`` is set, in which
+    case every non-empty line is. The file is read in batches of
+    ``batch_lines`` lines. A whole-file document is encoded in pieces of
+    about ``chunk_chars`` characters cut by split_text, which no tokenizer
+    merges across, so its IDs equal ``encode`` of the file. Memory then
+    stays bounded by the batch and chunk sizes, with one exception:
+    SentencePiece breaks ties between equal-scoring segmentations by
+    position, so a SentencePiece document is read and encoded whole, and
+    memory grows with the file. Both outputs are written to temporary names
+    and renamed once complete.
+    Returns (num_tokens, num_documents).
+    """
+    limit = np.iinfo(dtype).max
+    if hasattr(tokenizer, 'sp') and not lines_as_documents:
+        chunk_chars = sys.maxsize
+    doc_offsets = [0]
+    num_tokens = 0
+    pending, pending_chars, flush_at = [], 0, chunk_chars
+    with open(source, "r", encoding="utf-8") as src, open(shard_path + ".bin.tmp", "wb") as out:
+        while True:
+            lines = [line for _, line in zip(range(batch_lines), src)]
+            if lines_as_documents:
+                if not lines:
+                    break
+                lines = [line for line in lines if line.strip()]
+                if not lines:
+                    continue
+            else:
+                pending.extend(lines)
+                pending_chars += sum(map(len, lines))
+                if lines and pending_chars < flush_at:
+                    continue
+                pieces = list(split_text("".join(pending), chunk_chars))
+                # The text after the last cut may continue in the next batch
+                pending = [pieces.pop()] if lines else []
+                pending_chars = sum(map(len, pending))
+                # Without a cut in it the tail is joined again only after another chunk_chars
+                flush_at = pending_chars + chunk_chars
+                lines = [piece for piece in pieces if piece]
+                if not lines:
+                    if pending:
+                        continue
+                    break
+            ids, offsets = tokenizer.encode_batch(lines, num_workers=1)
+            if ids.size and ids.max() > limit:
+                raise ValueError(f"Token ID {ids.max()} in {source} does not fit in {dtype}")
+            ids.astype(dtype).tofile(out)
+            if lines_as_documents:
+                doc_offsets.extend((num_tokens + offsets[1:]).tolist())
+            num_tokens += int(ids.size)
+    if not lines_as_documents:
+        doc_offsets.append(num_tokens)
+    np.asarray(doc_offsets, dtype=np.int64).tofile(shard_path + ".idx.tmp")
+    os.replace(shard_path + ".bin.tmp", shard_path + ".bin")
+    os.replace(shard_path + ".idx.tmp", shard_path + ".idx")
+    return num_tokens, len(doc_offsets) - 1
+
+
+def _encode_shard_task(source: str, shard_path: str, dtype: str, lines_as_documents: bool) -> Tuple[int, int]:
+    return encode_file_to_shard(_worker_tokenizer, source, shard_path, dtype, lines_as_documents)
+
+
+def _write_manifest(output_dir: str, manifest: Dict) -> None:
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def load_manifest(output_dir: str) -> Optional[Dict]:
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_shards(tokenizer_class, vocab_file: str, corpus_dir: str, output_dir: str,
+                 dtype: Optional[str] = None, num_workers: Optional[int] = None,
+                 recursive: bool = False, lines_as_documents: bool = False) -> Dict:
+    """Pretokenize every .txt file of ``corpus_dir`` into token shards under ``output_dir``.
+
+    Each input file becomes one shard, encoded by a pool of workers that each
+    load the tokenizer from ``vocab_file``. ``manifest.json`` records the
+    finished shards; rerunning the command skips them, so an interrupted run
+    resumes where it stopped. ``dtype`` defaults to uint16 when the vocabulary
+    fits, otherwise uint32.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    if dtype is None:
+        if manifest:
+            dtype = manifest["dtype"]
+        else:
+            tokenizer = tokenizer_class()
+            tokenizer.load(vocab_file)
+            dtype = "uint16" if vocab_bound(tokenizer) <= np.iinfo(np.uint16).max + 1 else "uint32"
+    if manifest is None:
+        # tokenizer_class may be a functools.partial, e.g. a RegexTokenizer with its pattern
+        tokenizer_name = getattr(tokenizer_class, "func", tokenizer_class).__name__
+        manifest = {"tokenizer": tokenizer_name, "vocab_file": vocab_file,
+                    "dtype": dtype, "lines_as_documents": lines_as_documents, "shards": {}}
+    elif manifest["dtype"] != dtype or manifest["lines_as_documents"] != lines_as_documents:
+        raise ValueError(f"{output_dir} holds shards written with different settings; use a new output directory")
+
+    sources = sorted(corpus_files(corpus_dir, recursive=recursive))
+    pending = []
+    for i, source in enumerate(sources):
+        shard_name = f"shard_{i:05d}"
+        shard_path = os.path.join(output_dir, shard_name)
+        done = manifest["shards"].get(shard_name)
+        if done and done["source"] == source and os.path.exists(shard_path + ".bin"):
+            continue
+        pending.append((source, shard_name, shard_path))
+
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_shard_worker,
+                             initargs=(tokenizer_class, vocab_file)) as executor:
+        futures = {executor.submit(_encode_shard_task, source, shard_path, dtype, lines_as_documents):
+                   (source, shard_name) for source, shard_name, shard_path in pending}
+        with tqdm(total=len(sources), initial=len(sources) - len(pending), unit="file") as progress:
+            for future in as_completed(futures):
+                source, shard_name = futures[future]
+                num_tokens, num_docs = future.result()
+                manifest["shards"][shard_name] = {"source": source, "num_tokens": num_tokens,
+                                                  "num_documents": num_docs}
+                _write_manifest(output_dir, manifest)
+                progress.update(1)
+                progress.set_postfix(tokens=sum(s["num_tokens"] for s in manifest["shards"].values()))
+
+    _write_manifest(output_dir, manifest)
+    return manifest
+
+
+def load_shard(output_dir: str, shard_name: str) -> Tuple[np.memmap, np.memmap]:
+    """Map a shard without copying: returns (token IDs, document offsets).
+
+    Document ``i`` is ``tokens[offsets[i]:offsets[i + 1]]``.
+    """
+    manifest = load_manifest(output_dir)
+    path = os.path.join(output_dir, shard_name)
+    if os.path.getsize(path + ".bin") == 0:
+        # numpy cannot map an empty file
+        return np.zeros(0, dtype=manifest["dtype"]), np.fromfile(path + ".idx", dtype=np.int64)
+    tokens = np.memmap(path + ".bin", dtype=manifest["dtype"], mode="r")
+    offsets = np.memmap(path + ".idx", dtype=np.int64, mode="r")
+    return tokens, offsets
+
+
+def list_shards(output_dir: str) -> List[str]:
+    """Names of the finished shards, in corpus order."""
+    return sorted(load_manifest(output_dir)["shards"])
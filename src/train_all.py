@@ -0,0 +1,84 @@
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from src.utils import corpus_files, iter_corpus, peak_rss_mb
+
+
+def shard_corpus(corpus_dir: str, output_dir: str, num_shards: int, recursive: bool = False) -> List[str]:
+    """Read the corpus once and write it to ``num_shards`` .txt files of about equal size.
+
+    Lines are kept whole and in corpus order. Every trainer then reads the
+    shards, which are small, local and usually still in the page cache, and
+    the file-parallel counting in count_words gets one shard per worker.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    total = sum(os.path.getsize(path) for path in corpus_files(corpus_dir, recursive=recursive))
+    target = max(1, -(-total // max(1, num_shards)))
+    paths, out, written = [], None, 0
+    for line in iter_corpus(corpus_dir, recursive=recursive):
+        if out is None or (written >= target and len(paths) < num_shards):
+            if out is not None:
+                out.close()
+            paths.append(os.path.join(output_dir, f"shard_{len(paths):05d}.txt"))
+            out = open(paths[-1], "w", encoding="utf-8")
+            written = 0
+        out.write(line)
+        written += len(line.encode("utf-8"))
+    if out is not None:
+        out.close()
+    return paths
+
+
+def _train_backend(train_fn: Callable, tokenizer_class, corpus_dir: str, vocab_file: str, kwargs: Dict) -> Dict:
+    start = time.perf_counter()
+    train_fn(tokenizer_class(), corpus_dir, vocab_file, **kwargs)
+    return {"wall_s": time.perf_counter() - start,
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(children=True)}
+
+
+def train_all(train_fn: Callable, backends: Dict[str, tuple], corpus_dir: str,
+              num_workers: Optional[int] = None, recursive: bool = False) -> Dict[str, Dict]:
+    """Train several tokenizers at once from a single pass over the corpus.
+
+    ``backends`` maps a name to ``(tokenizer_class, vocab_file, kwargs)``; each
+    is trained by ``train_fn(tokenizer, corpus_dir, vocab_file, **kwargs)`` in
+    its own fresh process, so the reported peak memory is that backend's
+    alone. ``num_workers`` (default: all cores) is split between the
+    backends and passed on as their ``num_workers``.
+    Returns wall time and peak RSS per backend, plus the corpus sharding time.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    per_backend = max(1, num_workers // len(backends))
+    shard_dir = tempfile.mkdtemp(prefix="train_all_")
+    try:
+        start = time.perf_counter()
+        shards = shard_corpus(corpus_dir, shard_dir, num_workers, recursive=recursive)
+        report = {"shard": {"wall_s": time.perf_counter() - start, "num_shards": len(shards)}}
+
+        # One single-use spawn pool per backend: each starts from a clean interpreter
+        context = multiprocessing.get_context("spawn")
+        executors = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in backends]
+        try:
+            futures = {executor.submit(_train_backend, train_fn, tokenizer_class, shard_dir, vocab_file,
+                                       dict(kwargs, num_workers=per_backend)): name
+                       for executor, (name, (tokenizer_class, vocab_file, kwargs))
+                       in zip(executors, backends.items())}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    report[name] = dict(future.result(), vocab_file=backends[name][1])
+                except Exception as e:
+                    report[name] = {"error": str(e)}
+                print(f"Finished {name} tokenizer")
+        finally:
+            for executor in executors:
+                executor.shutdown()
+        report["total"] = {"wall_s": time.perf_counter() - start}
+        return report
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
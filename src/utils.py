@@ -1,6 +1,59 @@
 import os
-from typing import List, Dict
-from collections import Counter
+import sys
+import ast
+import json
+import threading
+from array import array
+from typing import List, Dict, Any, Hashable, Iterable, Iterator, NamedTuple, Optional, Tuple
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, islice
+import numpy as np
+import regex
+
+class Encoding(NamedTuple):
+    """Result of encode_full: tokens, their IDs and (start, end) character offsets into the input."""
+    tokens: List[str]
+    ids: List[int]
+    offsets: List[Tuple[int, int]]
+
+class Chunk(NamedTuple):
+    """A window of token IDs from chunk(), and the [start, end) character span of the text it covers."""
+    ids: List[int]
+    start: int
+    end: int
+
+def window_tokens(tokens: Iterable[Tuple[int, int, int]], max_tokens: int, stride: int = 0) -> Iterator[Chunk]:
+    """Group a stream of (id, start, end) tokens into windows of at most ``max_tokens`` IDs.
+
+    Consecutive windows share ``stride`` tokens of overlap. Only
+    ``max_tokens`` tokens are held at a time, so a document is windowed while
+    it is being encoded. The last window may be shorter.
+    """
+    if max_tokens <= 0:
+        raise ValueError(f"max_tokens must be positive, got {max_tokens}")
+    if not 0 <= stride < max_tokens:
+        raise ValueError(f"stride must be in [0, max_tokens), got {stride}")
+    window = []
+    fresh = 0  # tokens not in any window yielded so far
+    for token in tokens:
+        window.append(token)
+        fresh += 1
+        if len(window) == max_tokens:
+            yield Chunk([id for id, _, _ in window], window[0][1], window[-1][2])
+            window = window[max_tokens - stride:] if stride else []
+            fresh = 0
+    if fresh:
+        yield Chunk([id for id, _, _ in window], window[0][1], window[-1][2])
+
+def byte_to_char_offsets(text: str) -> List[int]:
+    """Map every UTF-8 byte offset of ``text`` (plus the end) to the index of its character."""
+    mapping = []
+    for i, char in enumerate(text):
+        mapping.extend([i] * len(char.encode("utf-8")))
+    mapping.append(len(text))
+    return mapping
 
 def read_corpus(directory: str) -> str:
     """Read all .txt files in the given directory and return their contents as a single string."""
@@ -11,6 +64,136 @@ def read_corpus(directory: str) -> str:
                 corpus.append(file.read())
     return " ".join(corpus)
 
+def corpus_files(directory: str, recursive: bool = False) -> List[str]:
+    """Return the paths of the .txt files in the given directory, in read_corpus order.
+
+    With ``recursive`` subdirectories are searched too, each after the files of its parent.
+    """
+    if not recursive:
+        return [os.path.join(directory, filename) for filename in os.listdir(directory)
+                if filename.endswith(".txt")]
+    paths = []
+    for root, _, filenames in os.walk(directory):
+        paths.extend(os.path.join(root, filename) for filename in filenames if filename.endswith(".txt"))
+    return paths
+
+def iter_corpus(directory: str, mode: str = "lines", chunk_size: int = 1 << 20,
+                buffer_size: int = 1 << 16, recursive: bool = False) -> Iterator[str]:
+    """Stream the .txt files of a directory without loading them into memory.
+
+    Yields lines (``mode="lines"``, newlines kept) or pieces of at most
+    ``chunk_size`` characters (``mode="chunks"``). ``buffer_size`` is the
+    read buffer of each file.
+    """
+    if mode not in ("lines", "chunks"):
+        raise ValueError(f"Unknown corpus mode: {mode}")
+    for path in corpus_files(directory, recursive=recursive):
+        with open(path, "r", encoding="utf-8", buffering=buffer_size) as file:
+            if mode == "lines":
+                yield from file
+            else:
+                while True:
+                    chunk = file.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+def iter_corpus_batches(directory: str, batch_size: int = 1000, recursive: bool = False) -> Iterator[List[str]]:
+    """Stream the corpus lines in lists of ``batch_size`` lines."""
+    lines = iter_corpus(directory, recursive=recursive)
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            break
+        yield batch
+
+def count_file_words(path: str, pattern: Optional[str] = None, chunk_chars: int = 1 << 20) -> Counter:
+    """Count words in a single file, split on whitespace or by a regex pattern.
+
+    The file is read as one text cut at split_text's safe points, so a
+    pattern finds the same words as on the whole file, including runs of
+    whitespace that span lines.
+    """
+    counts = Counter()
+    split = regex.compile(pattern).findall if pattern else str.split
+    with open(path, "r", encoding="utf-8") as file:
+        for parts in _batch_pieces(file, chunk_chars):
+            for part in parts:
+                counts.update(split(part))
+    return counts
+
+def count_words(directory: str, num_workers: Optional[int] = None,
+                cache_file: Optional[str] = None, pattern: Optional[str] = None,
+                recursive: bool = False) -> Counter:
+    """Count words in all .txt files of a directory using a process pool.
+
+    Files are sharded across workers and the per-file Counters are merged in
+    file order, so words keep the first-occurrence order of ``read_corpus``.
+    If ``cache_file`` was written for the same pattern and the same corpus
+    files (paths, sizes and mtimes), the table is loaded from it instead;
+    otherwise the fresh table is written there.
+    """
+    files = corpus_files(directory, recursive=recursive)
+    header = counts_header(files, pattern)
+    if cache_file and os.path.exists(cache_file):
+        if read_counts_header(cache_file) == header:
+            return load_counts(cache_file)
+
+    counts = Counter()
+    count_file = partial(count_file_words, pattern=pattern)
+    if num_workers == 1 or len(files) <= 1:
+        for path in files:
+            counts.update(count_file(path))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            for file_counts in executor.map(count_file, files):
+                counts.update(file_counts)
+
+    if cache_file:
+        save_counts(counts, cache_file, header)
+    return counts
+
+def counts_header(files: List[str], pattern: Optional[str]) -> Dict[str, Any]:
+    """What a word-frequency table was counted from: the pattern and each file's path, size and mtime."""
+    sources = []
+    for path in files:
+        stat = os.stat(path)
+        sources.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return {"pattern": pattern, "files": sources}
+
+def read_counts_header(filename: str) -> Optional[Dict[str, Any]]:
+    """Header of a table written by save_counts, or None for a table without one."""
+    with open(filename, "r", encoding="utf-8") as f:
+        line = f.readline()
+    if not line.startswith("#"):
+        return None
+    try:
+        return json.loads(line[1:])
+    except ValueError:
+        return None
+
+def save_counts(counts: Dict[str, int], filename: str, header: Optional[Dict[str, Any]] = None) -> None:
+    """Save a word-frequency table; words are JSON-escaped so they may contain whitespace.
+
+    ``header`` is written as a ``#`` line first, for count_words to check the table is still current.
+    """
+    with open(filename, "w", encoding="utf-8") as f:
+        if header is not None:
+            f.write(f"#{json.dumps(header)}\n")
+        for word, count in counts.items():
+            f.write(f"{json.dumps(word, ensure_ascii=False)}\t{count}\n")
+
+def load_counts(filename: str) -> Counter:
+    """Load a word-frequency table written by save_counts."""
+    counts = Counter()
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            word, count = line.rstrip("\n").rsplit("\t", 1)
+            counts[json.loads(word)] = int(count)
+    return counts
+
 def get_vocab(tokens: List[str]) -> Dict[str, int]:
     """Create a vocabulary from a list of tokens."""
     return dict(Counter(tokens))
@@ -21,6 +204,16 @@ def save_vocab(vocab: Dict[str, int], filename: str) -> None:
         for token, count in vocab.items():
             f.write(f"{token}\t{count}\n")
 
+def parse_token(literal: str) -> str:
+    """Parse a repr()-quoted token from a vocab file without eval().
+
+    Plain quoted tokens are sliced directly; anything with escapes goes
+    through ast.literal_eval.
+    """
+    if len(literal) >= 2 and literal[0] == literal[-1] and literal[0] in "'\"" and "\\" not in literal:
+        return literal[1:-1]
+    return ast.literal_eval(literal)
+
 def load_vocab(filename: str) -> Dict[str, int]:
     """Load vocabulary from a file."""
     vocab = {}
@@ -33,4 +226,232 @@ def load_vocab(filename: str) -> Dict[str, int]:
             elif len(parts) == 1:
                 # If there's only one part, assume it's the token with a count of 1
                 vocab[parts[0]] = 1
-    return vocab
\ No newline at end of file
+    return vocab
+
+def peak_rss_mb(children: bool = False) -> float:
+    """Peak resident memory of this process, or of its largest waited-for child, in MiB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def little_endian(values: array) -> bytes:
+    """Bytes of an array in little-endian order, the byte order of the binary model formats."""
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def uint32_view(buffer: memoryview):
+    """Zero-copy uint32 view of a little-endian buffer (copied only on big-endian hosts)."""
+    if sys.byteorder == "little":
+        return buffer.cast("I")
+    values = array("I", bytes(buffer))
+    values.byteswap()
+    return values
+
+class LRUCache:
+    """Thread-safe bounded least-recently-used cache with hit/miss/eviction counters.
+
+    A tokenizer's cache is shared by the app's request threads. Pickled
+    copies, such as those sent to worker processes, get a lock of their own.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.data.clear()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def info(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.data),
+            'maxsize': self.maxsize
+        }
+
+
+def pack_ids(id_lists: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Flatten per-text ID lists into an int32 array plus int64 offsets.
+
+    The IDs of text ``i`` are ``ids[offsets[i]:offsets[i + 1]]``.
+    """
+    lengths = np.fromiter((len(ids) for ids in id_lists), dtype=np.int64, count=len(id_lists))
+    offsets = np.zeros(len(id_lists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    ids = np.fromiter(chain.from_iterable(id_lists), dtype=np.int32, count=int(offsets[-1]))
+    return ids, offsets
+
+_worker_tokenizer = None
+
+def _init_encode_worker(tokenizer) -> None:
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+def _encode_chunk(texts: List[str]) -> List[List[int]]:
+    return [_worker_tokenizer.encode(text) for text in texts]
+
+def encode_batch_in_processes(tokenizer, texts: List[str], num_workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode texts with a pure-Python tokenizer, spreading chunks over a process pool.
+
+    The tokenizer is sent to each worker once; texts are split into a few
+    chunks per worker to keep pickling overhead low.
+    """
+    texts = list(texts)
+    num_workers = num_workers or os.cpu_count() or 1
+    if num_workers == 1 or len(texts) <= 1:
+        return pack_ids([tokenizer.encode(text) for text in texts])
+
+    chunk_size = max(1, -(-len(texts) // (num_workers * 4)))
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_encode_worker,
+                             initargs=(tokenizer,)) as executor:
+        id_lists = list(chain.from_iterable(executor.map(_encode_chunk, chunks)))
+    return pack_ids(id_lists)
+
+def _count_chunk(pieces: List[str]) -> Counter:
+    counts = Counter()
+    for piece in pieces:
+        counts.update(_worker_tokenizer.tokenize(piece))
+    return counts
+
+_SAFE_CUT = regex.compile(r"(?<=\S)\n(?=\S)")
+
+def split_text(text: str, chunk_chars: int) -> Iterator[str]:
+    """Split text into pieces of roughly ``chunk_chars`` characters.
+
+    Cuts are placed after a lone newline between two non-space characters,
+    where none of the built-in patterns can join or re-split tokens.
+    """
+    start = 0
+    while len(text) - start > chunk_chars:
+        cut = _SAFE_CUT.search(text, start + chunk_chars)
+        if cut is None:
+            break
+        yield text[start:cut.end()]
+        start = cut.end()
+    yield text[start:]
+
+def _batch_pieces(pieces: Iterable[str], chunk_chars: int) -> Iterator[List[str]]:
+    """Regroup a stream of text pieces into batches of parts cut only by split_text.
+
+    The pieces are treated as one continuous text, so a token running across
+    two pieces, such as the newlines between two iter_corpus lines, stays whole.
+    """
+    pending, size, flush_at = [], 0, chunk_chars
+    for piece in pieces:
+        pending.append(piece)
+        size += len(piece)
+        if size < flush_at:
+            continue
+        parts = list(split_text("".join(pending), chunk_chars))
+        # The text after the last cut may continue in the next piece
+        tail = parts.pop()
+        if parts:
+            yield parts
+        pending, size = [tail], len(tail)
+        # Without a cut in it the tail is joined again only after another chunk_chars
+        flush_at = size + chunk_chars
+    parts = [part for part in split_text("".join(pending), chunk_chars) if part]
+    if parts:
+        yield parts
+
+def count_token_frequencies(tokenizer, pieces: Iterable[str], num_workers: Optional[int] = None,
+                            chunk_chars: int = 1 << 20) -> Counter:
+    """Count ``tokenizer.tokenize`` output over text pieces on a process pool.
+
+    The pieces are one continuous text, so the counts equal tokenizing their
+    concatenation. It is cut into batches of about ``chunk_chars`` characters
+    at split_text's safe points, and only a few batches per worker are in
+    flight, so streamed input such as iter_corpus is never held in memory at once.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    batches = _batch_pieces(pieces, chunk_chars)
+    head = list(islice(batches, 2))
+    counts = Counter()
+    if num_workers == 1 or len(head) < 2:
+        for batch in chain(head, batches):
+            counts.update(token for piece in batch for token in tokenizer.tokenize(piece))
+        return counts
+
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_encode_worker,
+                             initargs=(tokenizer,)) as executor:
+        in_flight = deque()
+        for batch in chain(head, batches):
+            in_flight.append(executor.submit(_count_chunk, batch))
+            if len(in_flight) >= 2 * num_workers:
+                counts.update(in_flight.popleft().result())
+        for future in in_flight:
+            counts.update(future.result())
+    return counts
+
+def build_vocab(counts: Dict[str, int], special_tokens: List[str], max_vocab_size: Optional[int] = None,
+                min_freq: int = 1) -> Dict[str, int]:
+    """Assign IDs: special tokens first, then tokens by descending frequency (ties by token).
+
+    Tokens rarer than ``min_freq`` are dropped and the vocabulary, special
+    tokens included, is capped at ``max_vocab_size`` entries.
+    """
+    vocab = {token: i for i, token in enumerate(special_tokens)}
+    ranked = sorted((item for item in counts.items() if item[1] >= min_freq and item[0] not in vocab),
+                    key=lambda item: (-item[1], item[0]))
+    if max_vocab_size is not None:
+        ranked = ranked[:max(0, max_vocab_size - len(vocab))]
+    for token, _ in ranked:
+        vocab[token] = len(vocab)
+    return vocab
+
+def extend_vocab(vocab: Dict[str, int], counts: Dict[str, int], max_new_tokens: Optional[int] = None,
+                 min_freq: int = 1) -> Dict[str, int]:
+    """IDs for the tokens of ``counts`` missing from ``vocab``, numbered after its highest ID.
+
+    New tokens are ranked like build_vocab (descending frequency, ties by
+    token); existing IDs are never changed. Returns only the new entries.
+    """
+    next_id = max(vocab.values(), default=-1) + 1
+    ranked = sorted((item for item in counts.items() if item[1] >= min_freq and item[0] not in vocab),
+                    key=lambda item: (-item[1], item[0]))
+    if max_new_tokens is not None:
+        ranked = ranked[:max(0, max_new_tokens)]
+    return {token: next_id + i for i, (token, _) in enumerate(ranked)}
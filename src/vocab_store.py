@@ -0,0 +1,240 @@
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Union
+from collections.abc import Mapping as MappingABC
+from array import array
+import os
+import mmap
+import struct
+import zlib
+from src.utils import load_vocab, parse_token, little_endian, uint32_view
+
+# Binary vocabulary layout: header, then uint32 arrays of blob offsets
+# (num_tokens + 1, tokens sorted by UTF-8 bytes), the ID of each sorted token
+# (num_tokens), the sorted index of each ID (num_ids, NO_TOKEN for gaps) and
+# the open-addressing hash table of sorted index + 1 (table_size, 0 = empty),
+# followed by the UTF-8 string blob. The CRC32 covers everything after the header.
+VOCAB_MAGIC = b'VOCB'
+VOCAB_VERSION = 1
+VOCAB_HEADER = '<4sHHIIIII'
+NO_TOKEN = 0xFFFFFFFF
+
+
+class VocabStore(MappingABC):
+    """Read-only token -> ID mapping stored in one contiguous buffer.
+
+    Tokens live in a single UTF-8 blob indexed by an offset array; lookups
+    hash the token's bytes into a table of indices, and ``token(id)`` is two
+    array reads. Nothing is parsed per entry on load: ``load`` maps the file
+    read-only, so worker processes loading the same vocabulary share its pages.
+    It behaves like the ``vocab`` dict it replaces; ``inverse`` is the
+    ID -> token view.
+
+    Up to ``cache_size`` looked-up tokens (and, for ``join``, decoded IDs) are
+    memoized in plain dicts. Token frequencies are heavily skewed, so this
+    small set serves most lookups at dict speed while memory stays bounded.
+    """
+
+    def __init__(self, buffer, path: Optional[str] = None, cache_size: int = 1 << 16):
+        self._buffer = buffer
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: Dict[str, Optional[int]] = {}
+        self._token_cache: Dict[int, str] = {}
+        header_size = struct.calcsize(VOCAB_HEADER)
+        magic, version, _, num_tokens, num_ids, table_size, blob_size, checksum = \
+            struct.unpack_from(VOCAB_HEADER, buffer)
+        if magic != VOCAB_MAGIC:
+            raise ValueError(f"Not a binary vocabulary: {path or 'buffer'}")
+        if version != VOCAB_VERSION:
+            raise ValueError(f"Unsupported vocabulary version {version} in {path or 'buffer'}")
+        view = memoryview(buffer)[header_size:]
+        if zlib.crc32(view) != checksum:
+            raise ValueError(f"Checksum mismatch in {path or 'buffer'}; the file is corrupt")
+
+        sections = {}
+        start = 0
+        for name, count in (('offsets', num_tokens + 1), ('ids', num_tokens),
+                            ('id_index', num_ids), ('table', table_size)):
+            sections[name] = uint32_view(view[start:start + 4 * count])
+            start += 4 * count
+        self._offsets = sections['offsets']
+        self._ids = sections['ids']
+        self._id_index = sections['id_index']
+        self._table = sections['table']
+        self._blob = view[start:start + blob_size]
+        self._mask = table_size - 1
+        self._len = num_tokens
+        self.inverse = InverseVocab(self)
+
+    @classmethod
+    def from_dict(cls, vocab: Mapping[str, int]) -> 'VocabStore':
+        return cls(serialize(vocab))
+
+    @classmethod
+    def load(cls, path: str) -> 'VocabStore':
+        """Map a binary vocabulary, or read a legacy tab-separated text vocabulary."""
+        with open(path, 'rb') as f:
+            if f.read(len(VOCAB_MAGIC)) != VOCAB_MAGIC:
+                legacy = load_vocab(path)
+                return cls.from_dict({parse_token(k): int(v) for k, v in legacy.items()})
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, path)
+
+    def save(self, path: str) -> None:
+        # Written aside and renamed: the buffer may be a mapping of ``path`` itself
+        with open(path + '.tmp', 'wb') as f:
+            f.write(self._buffer)
+        os.replace(path + '.tmp', path)
+
+    def __reduce__(self):
+        # Worker processes reopen the file rather than receiving a copy of it
+        if self.path is not None:
+            return VocabStore.load, (self.path,)
+        return VocabStore, (bytes(self._buffer),)
+
+    def _token_at(self, index: int) -> str:
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8', 'surrogatepass')
+
+    def get(self, token: str, default=None):
+        try:
+            id = self._cache[token]
+        except KeyError:
+            id = self._lookup(token)
+            if len(self._cache) < self.cache_size:
+                self._cache[token] = id
+        return default if id is None else id
+
+    def _lookup(self, token: str) -> Optional[int]:
+        data = token.encode('utf-8', 'surrogatepass')
+        table, offsets, blob, mask = self._table, self._offsets, self._blob, self._mask
+        slot = zlib.crc32(data) & mask
+        while True:
+            entry = table[slot]
+            if entry == 0:
+                return None
+            if blob[offsets[entry - 1]:offsets[entry]] == data:
+                return self._ids[entry - 1]
+            slot = (slot + 1) & mask
+
+    def __getitem__(self, token: str) -> int:
+        id = self.get(token)
+        if id is None:
+            raise KeyError(token)
+        return id
+
+    def __contains__(self, token) -> bool:
+        return isinstance(token, str) and self.get(token) is not None
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[str]:
+        """Tokens in ID order, like the dict built by ``build_vocab``."""
+        for index in sorted(range(self._len), key=self._ids.__getitem__):
+            yield self._token_at(index)
+
+    def token(self, id: int, default=None):
+        """Token with the given ID, in constant time."""
+        if 0 <= id < len(self._id_index):
+            index = self._id_index[id]
+            if index != NO_TOKEN:
+                return self._token_at(index)
+        return default
+
+    def join(self, ids: Iterable[int], separator: str = '', default: str = '<unk>') -> str:
+        """Tokens of ``ids`` joined by ``separator``; IDs without a token read ``default``.
+
+        Like lookups, decoded tokens are memoized in a dict of at most
+        ``cache_size`` entries, so decoding runs at dict speed without
+        holding every token as a Python string.
+        """
+        cache = self._token_cache
+        tokens = []
+        for id in ids:
+            token = cache.get(id)
+            if token is None:
+                token = self.token(id)
+                if token is None:
+                    token = default
+                elif len(cache) < self.cache_size:
+                    cache[id] = token
+            tokens.append(token)
+        return separator.join(tokens)
+
+    def token_table(self, default: str = '<unk>') -> 'TokenTable':
+        """ID-indexed sequence view of the tokens, for code that indexes a list of strings."""
+        return TokenTable(self, default)
+
+
+class TokenTable:
+    """``table[id]`` and ``len(table)`` over a VocabStore without copying its tokens into a list."""
+
+    def __init__(self, store: VocabStore, default: str = '<unk>'):
+        self.store = store
+        self.default = default
+
+    def __len__(self) -> int:
+        return len(self.store._id_index)
+
+    def __getitem__(self, id: int) -> str:
+        return self.store.token(id, self.default)
+
+
+class InverseVocab(MappingABC):
+    """ID -> token view of a VocabStore, replacing the ``inverse_vocab`` dict."""
+
+    def __init__(self, store: VocabStore):
+        self.store = store
+
+    def get(self, id: int, default=None):
+        return self.store.token(id, default)
+
+    def __getitem__(self, id: int) -> str:
+        token = self.store.token(id)
+        if token is None:
+            raise KeyError(id)
+        return token
+
+    def __contains__(self, id) -> bool:
+        return isinstance(id, int) and self.store.token(id) is not None
+
+    def __len__(self) -> int:
+        return sum(index != NO_TOKEN for index in self.store._id_index)
+
+    def __iter__(self) -> Iterator[int]:
+        return (id for id, index in enumerate(self.store._id_index) if index != NO_TOKEN)
+
+
+def serialize(vocab: Mapping[str, int]) -> bytes:
+    """Encode a token -> ID mapping in the binary layout described by VOCAB_HEADER."""
+    encoded = sorted((token.encode('utf-8', 'surrogatepass'), id) for token, id in vocab.items())
+    offsets = array('I', [0])
+    ids = array('I')
+    for data, id in encoded:
+        offsets.append(offsets[-1] + len(data))
+        ids.append(id)
+    num_ids = max(ids) + 1 if ids else 0
+    id_index = array('I', [NO_TOKEN]) * num_ids
+    for index, id in enumerate(ids):
+        id_index[id] = index
+
+    # Power-of-two table at most half full, so probe sequences stay short
+    table_size = 8
+    while table_size < 2 * len(encoded):
+        table_size *= 2
+    table = array('I', [0]) * table_size
+    mask = table_size - 1
+    for index, (data, _) in enumerate(encoded):
+        slot = zlib.crc32(data) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = index + 1
+
+    payload = b''.join([little_endian(offsets), little_endian(ids), little_endian(id_index),
+                        little_endian(table)] + [data for data, _ in encoded])
+    header = struct.pack(VOCAB_HEADER, VOCAB_MAGIC, VOCAB_VERSION, 0, len(encoded), num_ids,
+                         table_size, offsets[-1], zlib.crc32(payload))
+    return header + payload
+
+
+def as_vocab_store(vocab: Union[VocabStore, Dict[str, int]]) -> VocabStore:
+    return vocab if isinstance(vocab, VocabStore) else VocabStore.from_dict(vocab)
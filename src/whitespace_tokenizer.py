@@ -1,16 +1,68 @@
-from typing import List, Dict
-from src.utils import save_vocab, load_vocab
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, Tuple, Union
+import re
+import numpy as np
+from src.utils import encode_batch_in_processes, count_token_frequencies, build_vocab, extend_vocab, window_tokens, Encoding, Chunk
+from src.vocab_store import VocabStore, as_vocab_store
+from src.decode_stream import TextDecodeStream, decode_table
+from src.metrics import instrumented
 
+# Same split as str.split(): both use str.isspace() to find separators
+WHITESPACE_TOKEN = re.compile(r'\S+')
+
+@instrumented('whitespace')
 class WhitespaceTokenizer:
+    SPECIAL_TOKENS: List[str] = ['<unk>']
+
     def __init__(self):
         self.vocab = {}
         self.inverse_vocab = {}
+        # ID -> token list for decode, and the vocabulary it was built from
+        self._decode_table = []
+        self._decode_vocab = None
 
-    def fit(self, text: str):
-        """Build vocabulary from the given text."""
-        tokens = self.tokenize(text)
-        self.vocab = {token: i for i, token in enumerate(set(tokens))}
-        self.inverse_vocab = {i: token for token, i in self.vocab.items()}
+    def fit(self, text: Union[str, Iterable[str]], max_vocab_size: Optional[int] = None,
+            min_freq: int = 1, num_workers: Optional[int] = None):
+        """Build vocabulary from the given text, or from an iterable of text pieces such as utils.iter_corpus.
+
+        The pieces are read as one continuous text, so tokens spanning two lines
+        are counted as encode() sees them. Tokens are counted in parallel
+        chunks. IDs start with SPECIAL_TOKENS and then follow descending
+        frequency. ``min_freq`` and ``max_vocab_size`` cap the vocabulary.
+        """
+        pieces = [text] if isinstance(text, str) else text
+        # Workers get a vocab-less copy; this instance keeps its vocabulary for
+        # threads still encoding, and if counting fails
+        counts = count_token_frequencies(WhitespaceTokenizer(), pieces, num_workers=num_workers)
+        vocab = VocabStore.from_dict(build_vocab(counts, self.SPECIAL_TOKENS, max_vocab_size, min_freq))
+        self.vocab, self.inverse_vocab = vocab, vocab.inverse
+
+    def update(self, text: Union[str, Iterable[str]], max_new_tokens: Optional[int] = None,
+               min_freq: int = 1, num_workers: Optional[int] = None) -> int:
+        """Add the unseen tokens of new text to the vocabulary without renumbering existing ones.
+
+        New tokens get IDs after the current highest ID, by descending
+        frequency, so data encoded with the old vocabulary stays valid. A
+        vocabulary without an ``<unk>`` entry first gets one at its implicit
+        unknown ID, len(vocab). Returns the number of tokens added.
+        """
+        pieces = [text] if isinstance(text, str) else text
+        vocab = dict(self.vocab.items())
+        if '<unk>' not in vocab:
+            vocab['<unk>'] = self.unk_id
+        # Counting only tokenizes; a vocab-less instance is cheap to send to workers
+        # and leaves this one untouched for threads still encoding with it
+        counts = count_token_frequencies(WhitespaceTokenizer(), pieces, num_workers=num_workers)
+        added = extend_vocab(vocab, counts, max_new_tokens, min_freq)
+        if added or len(vocab) != len(self.vocab):
+            vocab.update(added)
+            self.vocab = VocabStore.from_dict(vocab)
+            self.inverse_vocab = self.vocab.inverse
+        return len(added)
+
+    @property
+    def unk_id(self) -> int:
+        """ID of unknown tokens; vocabularies saved before SPECIAL_TOKENS existed use len(vocab)."""
+        return self.vocab.get('<unk>', len(self.vocab))
 
     def tokenize(self, text: str) -> List[str]:
         """Tokenize the input text using whitespace as delimiter."""
@@ -19,24 +71,70 @@ class WhitespaceTokenizer:
     def encode(self, text: str) -> List[int]:
         """Encode the input text into token IDs."""
         tokens = self.tokenize(text)
-        return [self.vocab.get(token, len(self.vocab)) for token in tokens]
+        unk_id = self.unk_id
+        return [self.vocab.get(token, unk_id) for token in tokens]
+
+    def encode_full(self, text: str) -> Encoding:
+        """Tokens, IDs and character offsets from a single pass over the text."""
+        unk_id = self.unk_id
+        tokens, ids, offsets = [], [], []
+        for match in WHITESPACE_TOKEN.finditer(text):
+            token = match.group()
+            tokens.append(token)
+            ids.append(self.vocab.get(token, unk_id))
+            offsets.append(match.span())
+        return Encoding(tokens, ids, offsets)
+
+    def chunk(self, text: str, max_tokens: int, stride: int = 0) -> Iterator[Chunk]:
+        """Windows of at most ``max_tokens`` IDs with their character spans, overlapping by ``stride`` tokens."""
+        unk_id = self.unk_id
+        tokens = ((self.vocab.get(match.group(), unk_id), match.start(), match.end())
+                  for match in WHITESPACE_TOKEN.finditer(text))
+        return window_tokens(tokens, max_tokens, stride)
+
+    def encode_batch(self, texts: List[str], num_workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode many texts on a process pool into a flat int32 ID array plus offsets."""
+        return encode_batch_in_processes(self, texts, num_workers)
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens encode() would return, counted from the matches without building a token list."""
+        return sum(1 for _ in WHITESPACE_TOKEN.finditer(text))
+
+    def count_tokens_batch(self, texts: Iterable[str]) -> List[int]:
+        """Token count of each text."""
+        return [self.count_tokens(text) for text in texts]
+
+    def decode_table(self) -> Sequence[str]:
+        """ID -> token table: a view of a VocabStore, or a list built once per dict vocabulary."""
+        if isinstance(self.vocab, VocabStore):
+            return self.vocab.token_table()
+        if self._decode_vocab is not self.vocab:
+            self._decode_table = decode_table(self.inverse_vocab)
+            self._decode_vocab = self.vocab
+        return self._decode_table
 
     def decode(self, token_ids: List[int]) -> str:
         """Decode the token IDs back into text."""
-        tokens = [self.inverse_vocab.get(id, '<unk>') for id in token_ids]
-        return self.detokenize(tokens)
+        if isinstance(self.vocab, VocabStore):
+            # Straight from the mapped string blob; no per-token strings are kept
+            return self.vocab.join(token_ids, ' ')
+        table = self.decode_table()
+        size = len(table)
+        return ' '.join([table[id] if 0 <= id < size else '<unk>' for id in token_ids])
+
+    def decode_stream(self) -> TextDecodeStream:
+        """Incremental decoder whose ``step(id)`` returns the text each new ID adds."""
+        return TextDecodeStream(self.decode_table(), separator=' ')
 
     def detokenize(self, tokens: List[str]) -> str:
         """Detokenize the input tokens by joining them with a space."""
         return " ".join(tokens)
     def save(self, vocab_file):
-        # Ensure we're saving the tokens exactly as they are, including spaces
-        vocab_to_save = {repr(k): v for k, v in self.vocab.items()}
-        save_vocab(vocab_to_save, vocab_file)
+        """Save the vocabulary in the binary VocabStore format."""
+        as_vocab_store(self.vocab).save(vocab_file)
         print(f"\nVocabulary saved to {vocab_file}")
 
     def load(self, vocab_file):
-        loaded_vocab = load_vocab(vocab_file)
-        # Convert the loaded vocabulary back to the original format
-        self.vocab = {eval(k): int(v) for k, v in loaded_vocab.items()}
-        self.inverse_vocab = {int(v): eval(k) for k, v in loaded_vocab.items()}
\ No newline at end of file
+        """Map a binary vocabulary file, or read a legacy text one."""
+        self.vocab = VocabStore.load(vocab_file)
+        self.inverse_vocab = self.vocab.inverse
\ No newline at end of file
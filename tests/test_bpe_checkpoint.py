@@ -0,0 +1,50 @@
+from collections import Counter
+
+import pytest
+
+from src import BPETokenizer, RegexTokenizer
+
+CORPUS_FILE = "data/corpus/text_1.txt"
+
+
+def word_counts(byte_level):
+    with open(CORPUS_FILE, encoding="utf-8") as f:
+        text = "".join(line for _, line in zip(range(500), f))
+    if byte_level:
+        return Counter(RegexTokenizer("gpt2").pattern.findall(text)), text
+    return Counter(text.split()), text
+
+
+def train(word_freqs, vocab_size, byte_level, checkpoint_file=None, checkpoint_every=1000):
+    tokenizer = BPETokenizer(vocab_size=vocab_size, byte_level=byte_level)
+    tokenizer.train_from_word_counts(word_freqs, checkpoint_file, checkpoint_every)
+    return tokenizer
+
+
+@pytest.mark.parametrize("byte_level", [False, True])
+def test_resume_equals_fresh_run(tmp_path, byte_level):
+    word_freqs, text = word_counts(byte_level)
+    checkpoint_file = str(tmp_path / "bpe.ckpt")
+    fresh = train(word_freqs, 500, byte_level)
+
+    # A shorter run stands in for an interrupted one; resume() extends it to the full size
+    train(word_freqs, 420, byte_level, checkpoint_file, checkpoint_every=25)
+    resumed = BPETokenizer(vocab_size=500)
+    resumed.resume(checkpoint_file)
+
+    assert resumed.byte_level == byte_level
+    assert list(resumed.merges.items()) == list(fresh.merges.items())
+    assert resumed.vocab == fresh.vocab
+    assert resumed.encode(text) == fresh.encode(text)
+
+
+def test_train_resumes_from_existing_checkpoint(tmp_path):
+    word_freqs, _ = word_counts(False)
+    checkpoint_file = str(tmp_path / "bpe.ckpt")
+    fresh = train(word_freqs, 400, False)
+    train(word_freqs, 300, False, checkpoint_file)
+
+    resumed = BPETokenizer(vocab_size=400)
+    # The corpus is not read when a checkpoint exists
+    resumed.train(str(tmp_path / "missing_corpus"), checkpoint_file=checkpoint_file)
+    assert list(resumed.merges.items()) == list(fresh.merges.items())
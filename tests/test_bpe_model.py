@@ -0,0 +1,108 @@
+import pickle
+import struct
+import zlib
+from array import array
+from collections import Counter
+
+import pytest
+
+from src import BPETokenizer, RegexTokenizer
+
+CORPUS_FILE = "data/corpus/text_1.txt"
+LEGACY_JSON = "trained_vocabs/bpe_vocab.txt"
+
+
+def corpus_text():
+    with open(CORPUS_FILE, encoding="utf-8") as f:
+        return "".join(line for _, line in zip(range(400), f)) + "Ünïcödé 😀 naïve\n"
+
+
+def write_version_1(tokenizer, path):
+    """The binary layout before the mapped model: string table plus merge triples."""
+    strings = [tokenizer.inverse_vocab.get(id, "") for id in range(max(tokenizer.inverse_vocab) + 1)]
+    num_tokens = len(strings)
+    index = {token: id for id, token in enumerate(strings) if token}
+    merge_table = array("I")
+    for bigram, replacement in tokenizer.merges.items():
+        for part in bigram.split(" ") + [replacement]:
+            if part not in index:
+                index[part] = len(strings)
+                strings.append(part)
+            merge_table.append(index[part])
+    encoded = [token.encode("utf-8") for token in strings]
+    offsets = array("I", [0])
+    for token in encoded:
+        offsets.append(offsets[-1] + len(token))
+    payload = offsets.tobytes() + b"".join(encoded) + merge_table.tobytes()
+    header = struct.pack("<4sHHIIIII", b"BPEM", 1, int(tokenizer.byte_level), num_tokens, len(strings),
+                         len(tokenizer.merges), offsets[-1], zlib.crc32(payload))
+    with open(path, "wb") as f:
+        f.write(header + payload)
+
+
+@pytest.fixture(scope="module")
+def legacy():
+    tokenizer = BPETokenizer()
+    tokenizer.load(LEGACY_JSON)
+    return tokenizer
+
+
+@pytest.fixture(scope="module")
+def byte_level():
+    tokenizer = BPETokenizer(vocab_size=600, byte_level=True)
+    tokenizer.train_from_word_counts(Counter(RegexTokenizer("gpt2").pattern.findall(corpus_text())))
+    return tokenizer
+
+
+@pytest.mark.parametrize("model", ["legacy", "byte_level"])
+def test_saved_model_is_mapped_and_encodes_the_same(tmp_path, request, model):
+    tokenizer = request.getfixturevalue(model)
+    text = corpus_text()
+    path = str(tmp_path / "model.bin")
+    tokenizer.save(path)
+    loaded = BPETokenizer()
+    loaded.load(path)
+    assert type(loaded.model._buffer).__name__ == "mmap"
+    assert loaded.byte_level == tokenizer.byte_level
+    assert list(loaded.merges.items()) == list(tokenizer.merges.items())
+    assert dict(loaded.vocab.items()) == dict(tokenizer.vocab.items())
+    assert loaded.encode(text) == tokenizer.encode(text)
+    assert loaded.encode_full(text) == tokenizer.encode_full(text)
+    assert loaded.decode(loaded.encode(text)) == tokenizer.decode(tokenizer.encode(text))
+
+
+@pytest.mark.parametrize("model", ["legacy", "byte_level"])
+def test_version_1_models_still_load(tmp_path, request, model):
+    tokenizer = request.getfixturevalue(model)
+    text = corpus_text()
+    path = str(tmp_path / "model_v1.bin")
+    write_version_1(tokenizer, path)
+    loaded = BPETokenizer()
+    loaded.load(path)
+    assert list(loaded.merges.items()) == list(tokenizer.merges.items())
+    assert loaded.encode(text) == tokenizer.encode(text)
+
+
+def test_legacy_merge_symbols_outside_the_vocab(tmp_path, legacy):
+    # The legacy model merges symbols that never made it into its vocab; they get IDs past it
+    outside = {symbol for bigram, merged in legacy.merges.items()
+               for symbol in bigram.split(" ") + [merged] if symbol not in legacy.vocab}
+    assert outside
+    path = str(tmp_path / "model.bin")
+    legacy.save(path)
+    loaded = BPETokenizer()
+    loaded.load(path)
+    assert len(loaded.model.symbols) == len(outside)
+    assert all(loaded.model.symbol_id(symbol) >= loaded.model.num_tokens for symbol in outside)
+
+
+def test_pickled_tokenizer_maps_the_file_again(tmp_path, legacy):
+    path = str(tmp_path / "model.bin")
+    legacy.save(path)
+    tokenizer = BPETokenizer()
+    tokenizer.load(path)
+    data = pickle.dumps(tokenizer)
+    assert len(data) < 4096
+    copy = pickle.loads(data)
+    assert type(copy.model._buffer).__name__ == "mmap" and copy.model.path == path
+    assert copy.encode(corpus_text()) == tokenizer.encode(corpus_text())
@@ -0,0 +1,76 @@
+from collections import Counter
+from itertools import count
+
+import pytest
+
+from src.bpe_trainer import BPETrainer
+
+CORPUS_FILE = "data/corpus/text_1.txt"
+
+
+def rescan_merges(words, freqs, num_merges, make_symbol):
+    """The original trainer: recount every pair per merge and take ``max(pairs, key=pairs.get)``.
+
+    Merges respect symbol boundaries, and the pair dict is filled in corpus
+    order, so ties go to the pair that occurs first.
+    """
+    words = [list(word) for word in words]
+    merges = []
+    for _ in range(num_merges):
+        pairs = {}
+        for symbols, freq in zip(words, freqs):
+            for pair in zip(symbols, symbols[1:]):
+                pairs[pair] = pairs.get(pair, 0) + freq
+        if not pairs:
+            break
+        best = max(pairs, key=pairs.get)
+        new_symbol = make_symbol(best)
+        for idx, symbols in enumerate(words):
+            merged, i = [], 0
+            while i < len(symbols):
+                if i < len(symbols) - 1 and (symbols[i], symbols[i + 1]) == best:
+                    merged.append(new_symbol)
+                    i += 2
+                else:
+                    merged.append(symbols[i])
+                    i += 1
+            words[idx] = merged
+        merges.append((best, new_symbol))
+    return merges
+
+
+def corpus_words(max_lines=None):
+    with open(CORPUS_FILE, encoding="utf-8") as f:
+        text = "".join(line for _, line in zip(range(max_lines or 10 ** 9), f))
+    word_freqs = Counter(text.lower().split())
+    return [tuple(word) + ("</w>",) for word in word_freqs], list(word_freqs.values())
+
+
+def test_ties_go_to_first_occurrence():
+    words = [("c", "d"), ("a", "b"), ("c", "d", "a", "b"), ("x", "y")]
+    freqs = [1, 1, 1, 2]
+    merges = BPETrainer(words, freqs).train(10, "".join)
+    assert [pair for pair, _ in merges] == [("c", "d"), ("a", "b"), ("x", "y"), ("cd", "ab")]
+
+
+@pytest.mark.parametrize("words, freqs", [
+    # Overlapping runs: merging ("a", "a") in "aaaa" leaves "aa aa", not three pairs
+    ([("a",) * 7, ("a", "a", "b"), ("b", "a", "a")], [1, 2, 3]),
+    ([tuple("abababcab"), tuple("cabab"), tuple("bcbcbc")], [2, 1, 1]),
+])
+def test_small_corpora_match_rescan(words, freqs):
+    assert BPETrainer(words, freqs).train(20, "".join) == rescan_merges(words, freqs, 20, "".join)
+
+
+def test_corpus_matches_rescan():
+    words, freqs = corpus_words(max_lines=400)
+    assert BPETrainer(words, freqs).train(300, "".join) == rescan_merges(words, freqs, 300, "".join)
+
+
+def test_integer_symbols_match_rescan():
+    words, freqs = corpus_words(max_lines=200)
+    words = [tuple(word[:-1]) for word in words]
+    encoded = [tuple(b for char in word for b in char.encode("utf-8")) for word in words]
+    new_ids, expected_ids = count(256), count(256)
+    merges = BPETrainer(encoded, freqs, typecode="i").train(200, lambda pair: next(new_ids))
+    assert merges == rescan_merges(encoded, freqs, 200, lambda pair: next(expected_ids))
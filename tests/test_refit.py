@@ -0,0 +1,36 @@
+import pytest
+
+from src import RegexTokenizer, WhitespaceTokenizer
+
+
+def failing_pieces():
+    yield "some text\n"
+    raise OSError("corpus unreadable")
+
+
+@pytest.mark.parametrize("make_tokenizer", [WhitespaceTokenizer, lambda: RegexTokenizer("gpt2")])
+def test_failed_refit_keeps_vocabulary(make_tokenizer):
+    tokenizer = make_tokenizer()
+    tokenizer.fit("the quick brown fox\n", num_workers=1)
+    vocab = dict(tokenizer.vocab.items())
+    with pytest.raises(OSError):
+        tokenizer.fit(failing_pieces(), num_workers=1)
+    assert dict(tokenizer.vocab.items()) == vocab
+    assert tokenizer.inverse_vocab is tokenizer.vocab.inverse
+
+
+@pytest.mark.parametrize("make_tokenizer", [WhitespaceTokenizer, lambda: RegexTokenizer("gpt2")])
+def test_encoding_during_refit_uses_old_vocabulary(make_tokenizer):
+    tokenizer = make_tokenizer()
+    tokenizer.fit("the quick brown fox\n", num_workers=1)
+    expected = tokenizer.encode("the fox")
+    seen = []
+
+    def pieces():
+        # Runs while fit() is counting, as another thread would
+        seen.append(tokenizer.encode("the fox"))
+        yield "a new corpus\n"
+
+    tokenizer.fit(pieces(), num_workers=1)
+    assert seen == [expected]
+    assert tokenizer.unk_id not in tokenizer.encode("a new corpus\n")
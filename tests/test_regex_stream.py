@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from src import RegexTokenizer
+
+CORPUS_FILE = "data/corpus/text_1.txt"
+
+# Runs of spaces, newlines, digits, contractions and non-ASCII letters exercise every pattern branch
+SAMPLE = ("Hello,   world!\n\n  It's 2024 -- we've   got 12345 items\r\n"
+          "naïve café  \t tabs\t\nI'LL  don't   ..?!  ") * 20
+
+
+def corpus_text():
+    with open(CORPUS_FILE, encoding="utf-8") as f:
+        return "".join(line for _, line in zip(range(300), f))
+
+
+@pytest.mark.parametrize("pattern", sorted(RegexTokenizer.PATTERNS))
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("text", [SAMPLE, corpus_text()], ids=["sample", "corpus"])
+def test_tokenize_iter_equals_findall(pattern, chunk_size, text):
+    tokenizer = RegexTokenizer(pattern)
+    expected = tokenizer.pattern.findall(text)
+    assert list(tokenizer.tokenize_iter(text, chunk_size)) == expected
+    assert list(tokenizer.tokenize_iter(io.StringIO(text), chunk_size)) == expected
+
+
+@pytest.mark.parametrize("pattern", sorted(RegexTokenizer.PATTERNS))
+def test_tokenize_iter_over_uneven_chunks(pattern):
+    tokenizer = RegexTokenizer(pattern)
+    chunks, i = [], 0
+    for size in [1, 5, 2, 13, 3, 8] * 200:
+        chunks.append(SAMPLE[i:i + size])
+        i += size
+    chunks.append(SAMPLE[i:])
+    assert list(tokenizer.tokenize_iter(chunks)) == tokenizer.pattern.findall(SAMPLE)
+
+
+@pytest.mark.parametrize("pattern", sorted(RegexTokenizer.PATTERNS))
+def test_fit_on_lines_equals_fit_on_text(pattern):
+    text = "a \nb\n\n  c\n" + corpus_text()
+    from_lines, from_text = RegexTokenizer(pattern), RegexTokenizer(pattern)
+    from_lines.fit(io.StringIO(text), num_workers=1)
+    from_text.fit(text, num_workers=1)
+    assert dict(from_lines.vocab.items()) == dict(from_text.vocab.items())
+    assert "<unk>" not in from_lines.decode(from_lines.encode(text))
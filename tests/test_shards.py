@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src import WhitespaceTokenizer, RegexTokenizer, BPETokenizer, CustomHFTokenizer, CustomSPTokenizer
+from src.shards import encode_file_to_shard
+
+CORPUS_FILE = "data/corpus/text_1.txt"
+
+TOKENIZERS = [
+    (WhitespaceTokenizer, "trained_vocabs/whitespace_vocab.txt"),
+    (lambda: RegexTokenizer("gpt2"), "trained_vocabs/regex_vocab_gpt2.txt"),
+    (lambda: RegexTokenizer("gpt4"), "trained_vocabs/regex_vocab_gpt4.txt"),
+    (BPETokenizer, "trained_vocabs/bpe_vocab.bin"),
+    (CustomHFTokenizer, "trained_vocabs/hf_vocab.json"),
+    (CustomSPTokenizer, "trained_vocabs/sp_vocab.model"),
+]
+
+
+def read_shard(shard_path):
+    return (np.fromfile(shard_path + ".bin", dtype=np.uint32).tolist(),
+            np.fromfile(shard_path + ".idx", dtype=np.int64).tolist())
+
+
+@pytest.mark.parametrize("make_tokenizer, vocab_file", TOKENIZERS)
+def test_document_shard_equals_encode(tmp_path, make_tokenizer, vocab_file):
+    tokenizer = make_tokenizer()
+    tokenizer.load(vocab_file)
+    with open(CORPUS_FILE, encoding="utf-8") as f:
+        text = f.read()
+    shard_path = str(tmp_path / "shard")
+    # Small batches and chunks put many cuts inside the document
+    num_tokens, num_docs = encode_file_to_shard(tokenizer, CORPUS_FILE, shard_path, "uint32",
+                                                batch_lines=7, chunk_chars=300)
+    ids, offsets = read_shard(shard_path)
+    assert ids == list(tokenizer.encode(text))
+    assert (num_tokens, num_docs, offsets) == (len(ids), 1, [0, len(ids)])
+
+
+def test_document_shard_without_safe_cuts(tmp_path):
+    tokenizer = RegexTokenizer("gpt4")
+    tokenizer.load("trained_vocabs/regex_vocab_gpt4.txt")
+    text = "".join(f"Paragraph {i}, with words.\n\n" for i in range(200))
+    source = tmp_path / "paragraphs.txt"
+    source.write_text(text, encoding="utf-8")
+    encode_file_to_shard(tokenizer, str(source), str(tmp_path / "shard"), "uint32",
+                         batch_lines=5, chunk_chars=100)
+    assert read_shard(str(tmp_path / "shard"))[0] == list(tokenizer.encode(text))
+
+
+def test_line_documents(tmp_path):
+    tokenizer = RegexTokenizer("gpt2")
+    tokenizer.load("trained_vocabs/regex_vocab_gpt2.txt")
+    lines = ["first line\n", "\n", "second  line\n", "third\n"]
+    source = tmp_path / "lines.txt"
+    source.write_text("".join(lines), encoding="utf-8")
+    _, num_docs = encode_file_to_shard(tokenizer, str(source), str(tmp_path / "shard"), "uint32",
+                                       lines_as_documents=True, batch_lines=2)
+    ids, offsets = read_shard(str(tmp_path / "shard"))
+    assert num_docs == 3
+    assert [ids[start:end] for start, end in zip(offsets, offsets[1:])] == \
+        [list(tokenizer.encode(line)) for line in lines if line.strip()]
+
+
+def test_empty_file(tmp_path):
+    source = tmp_path / "empty.txt"
+    source.write_text("", encoding="utf-8")
+    tokenizer = WhitespaceTokenizer()
+    tokenizer.load("trained_vocabs/whitespace_vocab.txt")
+    assert encode_file_to_shard(tokenizer, str(source), str(tmp_path / "shard"), "uint32") == (0, 1)
@@ -0,0 +1,49 @@
+import pickle
+import threading
+from collections import Counter
+
+import pytest
+import regex
+
+from src import RegexTokenizer
+from src.utils import LRUCache, count_file_words
+
+
+@pytest.mark.parametrize("pattern", [None, RegexTokenizer.PATTERNS["gpt2"], RegexTokenizer.PATTERNS["gpt4"]])
+def test_count_file_words_equals_whole_text(tmp_path, pattern):
+    text = "a \nb\n\n  c\nword one\nword two  \n\n\nend" * 50
+    path = tmp_path / "text.txt"
+    path.write_text(text, encoding="utf-8")
+    expected = Counter(regex.findall(pattern, text) if pattern else text.split())
+    for chunk_chars in [10, 1 << 20]:
+        counts = count_file_words(str(path), pattern, chunk_chars)
+        # First-occurrence order matters too: it breaks ties between BPE merges
+        assert list(counts.items()) == list(expected.items())
+
+
+def test_lru_cache_is_thread_safe():
+    cache = LRUCache(maxsize=8)
+
+    def work(offset):
+        for i in range(20000):
+            key = (offset + i) % 32
+            if cache.get(key) is None:
+                cache.put(key, key)
+
+    threads = [threading.Thread(target=work, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) <= 8
+    assert cache.hits + cache.misses == 8 * 20000
+
+
+def test_lru_cache_pickles_without_its_lock():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.get("a") == 1
+    copy.put("b", 2)
+    copy.put("c", 3)
+    assert copy.get("a") is None and copy.evictions == 1